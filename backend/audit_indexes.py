@@ -0,0 +1,237 @@
+"""Index auditor for the CRM API queries.
+
+Runs ``explain`` on the queries the endpoints issue and reports any plan that
+falls back to a collection scan (COLLSCAN) or an in-memory SORT.
+
+The queries are built with the same helpers the endpoints use, for every sort
+in ``LEAD_SORT_FIELDS`` / ``TASK_SORT_FIELDS`` in both directions, each filter
+parameter, admin and sales scoping, and first and continuation keyset pages,
+so a new sort or filter is audited as soon as it is added.
+
+Usage against a development database (exits with status 1 on problems):
+
+    python audit_indexes.py
+
+``tests/test_index_audit.py`` runs the same audit under pytest.
+"""
+import asyncio
+import itertools
+import sys
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import main
+
+# Sample values for the sort keys in continuation cursors; None covers leads
+# whose sort field is missing (e.g. legacy leads before migrate_legacy_leads)
+SORT_SAMPLE_VALUES = {
+    "created_at": "2024-01-01T00:00:00",
+    "due_date": "2024-01-01",
+    "company_name": "Acme",
+    "price_paid": 100.0,
+    "invoice_billed": 50.0,
+    "status": "new"
+}
+
+LEAD_FILTER_PARAMS = {
+    "status_filter": "new",
+    "source": "website",
+    "assigned_to": str(ObjectId()),
+    "brand": "Brand",
+    "product": "Product",
+    "location": "Location",
+    "created_from": "2024-01-01",
+    "created_to": "2024-02-01"
+}
+
+TASK_FILTER_PARAMS = {
+    "status_filter": "pending",
+    "priority": "high",
+    "category": "call",
+    "related_lead": str(ObjectId()),
+    "due_from": "2024-01-01",
+    "due_to": "2024-02-01"
+}
+
+
+def command_filter(command: dict) -> dict:
+    if "find" in command or "count" in command or "distinct" in command:
+        return command.get("filter") or command.get("query") or {}
+    if "findAndModify" in command:
+        return command.get("query") or {}
+    if "aggregate" in command:
+        pipeline = command.get("pipeline") or []
+        return pipeline[0].get("$match", {}) if pipeline else {}
+    for key in ("updates", "deletes"):
+        if key in command and command[key]:
+            return command[key][0].get("q") or {}
+    return {}
+
+
+def plan_stages(explain: dict):
+    """Yield every stage name in the winning plans of an explain result"""
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "rejectedPlans":
+                continue
+            if key == "stage" and isinstance(value, str):
+                yield value
+            else:
+                yield from plan_stages(value)
+    elif isinstance(explain, list):
+        for item in explain:
+            yield from plan_stages(item)
+
+
+def find_plan_problems(command: dict, explain: dict) -> list:
+    stages = set(plan_stages(explain))
+    problems = []
+    # Reading a whole collection on purpose (lookup lists, admin user list) is fine,
+    # but a filtered query should always be answered from an index.
+    if "COLLSCAN" in stages and command_filter(command):
+        problems.append("COLLSCAN")
+    # Relevance order only exists after the text match, so that SORT is expected
+    sorts_by_score = any(isinstance(v, dict) for v in (command.get("sort") or {}).values())
+    if "SORT" in stages and not sorts_by_score:
+        problems.append("in-memory SORT")
+    return problems
+
+
+async def audit(db, commands) -> list:
+    problems = []
+    for command in commands:
+        explain = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        found = find_plan_problems(command, explain)
+        if found:
+            problems.append((command, found))
+    return problems
+
+
+def single_filters(params: dict) -> list:
+    """No filter, then each filter parameter on its own (a from/to range as one pair)"""
+    uppers = {name[:-len("_from")] + "_to" for name in params if name.endswith("_from")}
+    combos = [{}]
+    for name, value in params.items():
+        if name in uppers:
+            continue
+        combo = {name: value}
+        upper = name[:-len("_from")] + "_to"
+        if name.endswith("_from") and upper in params:
+            combo[upper] = params[upper]
+        combos.append(combo)
+    return combos
+
+
+def lead_filters(**params) -> dict:
+    return main.get_lead_filters(**{name: params.get(name) for name in LEAD_FILTER_PARAMS})
+
+
+def task_filters(**params) -> tuple:
+    return main.get_task_filters(**{name: params.get(name) for name in TASK_FILTER_PARAMS})
+
+
+def sample_cursors(sort_field: str, direction: int) -> list:
+    """No cursor, a cursor after a regular value and one after a missing value"""
+    cursors = [None]
+    for value in (SORT_SAMPLE_VALUES[sort_field], None):
+        cursors.append(main.encode_cursor({"_id": ObjectId(), sort_field: value}, sort_field, direction))
+    return cursors
+
+
+def page_commands(collection: str, query: dict, sort_fields: dict) -> list:
+    commands = []
+    for sort_field, direction in itertools.product(sort_fields.values(), (1, -1)):
+        for cursor in sample_cursors(sort_field, direction):
+            commands.append({
+                "find": collection,
+                "filter": main.keyset_query(query, sort_field, direction, cursor),
+                "sort": {sort_field: direction, "_id": direction}
+            })
+    return commands
+
+
+def lead_commands(users: list) -> list:
+    """/leads pages and full lists, /leads/export, /leads/search and /reports/summary"""
+    commands = []
+    for user, params in itertools.product(users, single_filters(LEAD_FILTER_PARAMS)):
+        query = main.scope_leads_query(lead_filters(**params), user)
+        commands += page_commands("leads", query, main.LEAD_SORT_FIELDS)
+        commands.append({
+            "find": "leads",
+            "filter": {**query, "$text": {"$search": main.build_search_terms("acme")}},
+            "projection": {"score": {"$meta": "textScore"}},
+            "sort": {"score": {"$meta": "textScore"}, "_id": -1}
+        })
+    for user in users:
+        query = main.scope_leads_query(
+            main.build_created_range(LEAD_FILTER_PARAMS["created_from"], LEAD_FILTER_PARAMS["created_to"]), user
+        )
+        commands.append({"aggregate": "leads", "cursor": {}, "pipeline": main.build_report_summary_pipeline(query)})
+    return commands
+
+
+def task_commands(user_id: str) -> list:
+    """/tasks pages, full lists and facet counts"""
+    commands = []
+    for params in single_filters(TASK_FILTER_PARAMS):
+        base_filters, facet_filters = task_filters(**params)
+        base_query = {"user_id": user_id, **base_filters}
+        commands += page_commands("tasks", {**base_query, **facet_filters}, main.TASK_SORT_FIELDS)
+        commands.append({"aggregate": "tasks", "cursor": {}, "pipeline": main.build_task_facets_pipeline(base_query)})
+    return commands
+
+
+def calendar_commands(user_id: str) -> list:
+    """/calendar/events, /calendar/free-busy and the conflict check on create/update"""
+    now = datetime.utcnow()
+    start_sort = {"start": 1}
+    queries = [
+        main.calendar_events_query(user_id),
+        main.calendar_events_query(user_id, "2024-01-01"),
+        main.calendar_events_query(user_id, None, "2024-02-01"),
+        main.calendar_events_query(user_id, "2024-01-01", "2024-02-01"),
+        main.overlapping_events_query([user_id], now, now + timedelta(hours=1)),
+        main.overlapping_events_query([user_id], now, now + timedelta(hours=1), ObjectId()),
+        main.overlapping_events_query([user_id, str(ObjectId())], now, now + timedelta(days=7))
+    ]
+    return [{"find": "calendar_events", "filter": query, "sort": start_sort} for query in queries]
+
+
+def point_commands(user_id: str) -> list:
+    """Lookups by key: login, current user, targets, duplicate checks, bulk updates"""
+    return [
+        {"find": "users", "filter": {"email": "admin@lead.com"}},
+        {"find": "users", "filter": {"_id": ObjectId()}},
+        {"find": "users", "filter": {"role": {"$in": ["sales", "admin"]}}},
+        {"find": "leads", "filter": {"_id": {"$in": [ObjectId()]}}},
+        {"find": "leads", "filter": {"dedupe_key": "a@b.com|5551234|acme"}},
+        {"find": "leads", "filter": {"dedupe_key": {"$in": ["a@b.com|5551234|acme"]}}},
+        {"aggregate": "leads", "cursor": {}, "pipeline": main.build_achievements_pipeline([user_id])},
+        {"find": "targets", "filter": {"user_id": user_id}},
+        {"find": "login_attempts", "filter": {"email": "admin@lead.com"}}
+    ]
+
+
+def representative_commands() -> list:
+    """The query shapes issued by the endpoints in main.py"""
+    user_id = str(ObjectId())
+    users = [{"_id": ObjectId(), "role": "admin"}, {"_id": ObjectId(user_id), "role": "sales"}]
+    return (
+        lead_commands(users) + task_commands(user_id) + calendar_commands(user_id) + point_commands(user_id)
+    )
+
+
+async def run_audit() -> int:
+    await main.ensure_indexes()
+    commands = representative_commands()
+    problems = await audit(main.db, commands)
+
+    for command, found in problems:
+        print(f"{', '.join(found)}: {command}")
+    print(f"Audited {len(commands)} queries, {len(problems)} with problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run_audit()))
@@ -0,0 +1,77 @@
+"""Serialization benchmark for large list responses.
+
+Compares the default FastAPI path (format_* dicts walked again by
+``jsonable_encoder`` and rendered by the stdlib ``json`` module) with
+``json_response``, which hands the formatted dicts straight to orjson.
+
+Runs without a database:
+
+    python benchmark_serialization.py [number_of_leads]
+"""
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import main
+
+
+def sample_leads(count: int) -> list:
+    created = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "company_representative_name": f"Representative {i}",
+            "company_name": f"Company {i}",
+            "email": f"lead{i}@example.com",
+            "phone": f"+1555{i:07d}",
+            "source": "website",
+            "price_paid": float(i % 1000),
+            "invoice_billed": float(i % 700),
+            "status": "new",
+            "assigned_to": str(ObjectId()),
+            "brand": "Brand",
+            "product": "Product",
+            "location": "Location",
+            "notes": "Follow up next week",
+            "update": "Jan 01",
+            "created_at": (created + timedelta(minutes=i)).isoformat()
+        }
+        for i in range(count)
+    ]
+
+
+def render_default(leads: list) -> bytes:
+    payload = {"success": True, "data": [main.format_lead_response(lead) for lead in leads]}
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def render_fast(leads: list) -> bytes:
+    payload = {"success": True, "data": [main.format_lead_response(lead) for lead in leads]}
+    return main.json_response(payload).body
+
+
+def best_of(func, leads: list, runs: int = 5) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func(leads)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main_benchmark(count: int):
+    leads = sample_leads(count)
+    before = best_of(render_default, leads)
+    after = best_of(render_fast, leads)
+    print(f"{count} leads")
+    print(f"  jsonable_encoder + json: {before * 1000:8.1f} ms")
+    print(f"  json_response (orjson):  {after * 1000:8.1f} ms")
+    print(f"  speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,107 @@
+"""JSON logging for the CRM API.
+
+Records are put on an in-memory queue by a ``QueueHandler`` and written to
+stdout by a ``QueueListener`` thread, so a log call on the event loop never
+waits on stdout. Every record carries the id of the request it was logged in.
+
+Configuration (environment):
+
+    LOG_LEVEL=INFO                              root level
+    LOG_LEVELS=main=DEBUG,pymongo=WARNING       per-logger overrides
+"""
+import json
+import logging
+import queue
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+STANDARD_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Copy the current request id onto the record in the logging task's context"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-")
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_RECORD_FIELDS:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+def parse_module_levels(value: str) -> dict:
+    """Parse ``name=LEVEL,name=LEVEL`` into a dict, ignoring malformed entries"""
+    levels = {}
+    for item in (value or "").split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: str = "INFO", module_levels: str = "") -> QueueListener:
+    """Route all logging through a queue; returns the started listener to stop at shutdown"""
+    log_queue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, stream_handler)
+
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level.upper())
+    for name, module_level in parse_module_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    listener.start()
+    return listener
+
+
+class RequestIdMiddleware:
+    """Bind a request id (incoming X-Request-ID or a new one) and echo it in the response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = REQUEST_ID_HEADER.lower().encode()
+        incoming = dict(scope["headers"]).get(header, b"").decode("latin-1")[:64]
+        request_id = incoming or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -1,27 +1,72 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, BackgroundTasks, UploadFile, File, status
+from fastapi.responses import StreamingResponse, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import DuplicateKeyError
+from pymongo import ReturnDocument, UpdateOne, IndexModel, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import DuplicateKeyError, BulkWriteError, OperationFailure
 from bson import ObjectId
-from datetime import datetime, timedelta
+from bson.errors import InvalidId
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 from typing import Optional, List
 import os
 from dotenv import load_dotenv
 import jwt
 from passlib.context import CryptContext
-from pydantic import BaseModel, Field, EmailStr, validator
+from pydantic import BaseModel, Field, EmailStr, ValidationError, validator
 import uvicorn
 import secrets
 import hashlib
 import time
+import base64
+import csv
+import io
+import asyncio
+import json
+import re
+import itertools
+import orjson
 from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import tempfile
+from logging_config import setup_logging, RequestIdMiddleware
+from settings import (
+    MONGODB_CONNECTION_STRING, DEFAULT_MONGODB_CONNECTION_STRING, MONGO_MIN_POOL_SIZE,
+    MONGO_REPORT_READ_PREFERENCE, mongo_client_options
+)
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from metrics import (
+    MetricsMiddleware, CommandMetrics, PoolMetrics, register_password_work, monitor_event_loop_lag
+)
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # in requirements.txt; without it /leads/export?format=xlsx answers 400
+    Workbook = None
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="ZownLead CRM API", version="1.0.0")
+log_listener = setup_logging(os.getenv("LOG_LEVEL", "INFO"), os.getenv("LOG_LEVELS", ""))
+
+def json_default(value):
+    """orjson hook for the BSON values that can reach a response body"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class FastJSONResponse(Response):
+    """JSON rendered by orjson, which writes datetimes as ISO 8601 itself"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(title="ZownLead CRM API", version="1.0.0", default_response_class=FastJSONResponse)
 
 logger = logging.getLogger(__name__)
 
@@ -32,35 +77,62 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Security configuration
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# MongoDB connection
-MONGODB_CONNECTION_STRING = os.getenv("MONGODB_CONNECTION_STRING")
+# Configuration (MongoDB client options live in settings.py)
 JWT_SECRET = os.getenv("JWT_SECRET", secrets.token_urlsafe(32))
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 MAX_LOGIN_ATTEMPTS = 5
 LOCKOUT_DURATION_MINUTES = 30
-
-print(f"MongoDB Connection String: {MONGODB_CONNECTION_STRING}")
-print(f"JWT Secret: {JWT_SECRET[:10]}...")
+ACHIEVEMENT_RECONCILE_INTERVAL_MINUTES = int(os.getenv("ACHIEVEMENT_RECONCILE_INTERVAL_MINUTES", "60"))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "200"))
+REFERENCE_CACHE_TTL_SECONDS = int(os.getenv("REFERENCE_CACHE_TTL_SECONDS", "300"))
+# How long a reference snapshot is used before its generation is checked again
+REFERENCE_VERSION_CHECK_SECONDS = 1
+STRICT_LEAD_REFERENCES = os.getenv("STRICT_LEAD_REFERENCES", "false").lower() == "true"
+CHANGE_STREAM_EVENTS = os.getenv("CHANGE_STREAM_EVENTS", "false").lower() == "true"
+EVENT_STREAM_QUEUE_SIZE = 1000
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+STREAM_TOKEN_EXPIRE_MINUTES = int(os.getenv("STREAM_TOKEN_EXPIRE_MINUTES", "10"))
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+EXPORT_BATCH_SIZE = 500
+MIGRATION_BATCH_SIZE = 1000
+MAX_EVENT_DURATION_MINUTES = 480
+MAX_FREE_BUSY_DAYS = 31
+# Zone of the date/time users enter for calendar events; start/end are stored as naive UTC
+CALENDAR_TIMEZONE = ZoneInfo(os.getenv("CALENDAR_TIMEZONE", "UTC"))
+LEAD_SCHEMA_VERSION = 2
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+if not os.getenv("JWT_SECRET"):
+    logger.warning("JWT_SECRET is not set; using a random secret, tokens will not survive a restart")
 
 if not MONGODB_CONNECTION_STRING:
-    print("WARNING: MONGODB_CONNECTION_STRING environment variable is not set!")
-    print("Please set it in your .env file")
-    MONGODB_CONNECTION_STRING = "mongodb://localhost:27017/zownlead_crm"
-    print(f"Using default connection string: {MONGODB_CONNECTION_STRING}")
+    logger.warning("MONGODB_CONNECTION_STRING is not set; using a local MongoDB at localhost:27017")
 
+# MongoDB connection
 try:
-    client = AsyncIOMotorClient(MONGODB_CONNECTION_STRING)
+    client = AsyncIOMotorClient(
+        MONGODB_CONNECTION_STRING or DEFAULT_MONGODB_CONNECTION_STRING,
+        event_listeners=[CommandMetrics(), PoolMetrics()],
+        **mongo_client_options()
+    )
     db = client.crm_database
-    print("MongoDB client created successfully")
-except Exception as e:
-    print(f"Error creating MongoDB client: {e}")
+except Exception:
+    logger.exception("Error creating MongoDB client")
     raise
 
 # Collections
@@ -76,6 +148,84 @@ login_attempts_collection = db.login_attempts
 targets_collection = db.targets
 calendar_events_collection = db.calendar_events
 tasks_collection = db.tasks
+change_generations_collection = db.change_generations
+migrations_collection = db.migrations
+
+# Reports and exports tolerate slightly stale data, so they may read from secondaries
+report_leads_collection = leads_collection.with_options(read_preference=MONGO_REPORT_READ_PREFERENCE)
+
+MANAGEMENT_COLLECTIONS = {
+    "brands": brands_collection,
+    "products": products_collection,
+    "locations": locations_collection,
+    "statuses": statuses_collection,
+    "sources": sources_collection,
+    "ownership": ownership_collection
+}
+
+LEAD_SEARCH_WEIGHTS = {
+    "company_name": 10,
+    "company_representative_name": 8,
+    "email": 5,
+    "phone": 5,
+    "notes": 1
+}
+
+# Index plan: every index matches a filter + sort shape the endpoints issue,
+# equality fields first, then the sort keys with _id as the keyset tie-breaker.
+INDEX_SPECS = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("role", ASCENDING)])
+    ],
+    "leads": [
+        IndexModel([("email", ASCENDING)]),
+        # duplicate check on create / import
+        IndexModel([("dedupe_key", ASCENDING)]),
+        # admin list, default sort
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # sales list, achievement aggregation on assigned_to
+        IndexModel([("assigned_to", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("assigned_to", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # admin list filtered by status / source
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("source", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # the other LEAD_SORT_FIELDS, for admins and for sales users' own leads
+        *[
+            IndexModel(prefix + [(field, ASCENDING), ("_id", ASCENDING)])
+            for field in ("company_name", "price_paid", "invoice_billed", "status")
+            for prefix in ([], [("assigned_to", ASCENDING)])
+        ],
+        # /leads/search; no language so names, emails and phones are not stemmed
+        IndexModel(
+            [(field, TEXT) for field in LEAD_SEARCH_WEIGHTS],
+            weights=LEAD_SEARCH_WEIGHTS,
+            default_language="none",
+            name="lead_search"
+        )
+    ],
+    "targets": [
+        IndexModel([("user_id", ASCENDING)], unique=True)
+    ],
+    "login_attempts": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("locked_until", ASCENDING)], expireAfterSeconds=0)
+    ],
+    "calendar_events": [
+        # list and from/to window queries, ordered by start
+        IndexModel([("user_id", ASCENDING), ("start", ASCENDING)])
+    ],
+    "tasks": [
+        # list sorted by due date, keyset on _id; priority/category filter on top of it
+        IndexModel([("user_id", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("due_date", ASCENDING), ("_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)])
+    ]
+}
+
+async def ensure_indexes():
+    for collection_name, indexes in INDEX_SPECS.items():
+        await db[collection_name].create_indexes(indexes)
 
 # Enhanced Pydantic models
 class UserCreate(BaseModel):
@@ -117,6 +267,7 @@ class UserUpdate(BaseModel):
     password: Optional[str] = Field(None, min_length=8, max_length=128)
     role: Optional[str] = Field(None, pattern="^(admin|sales)$")
     phone_number: Optional[str] = Field(None, max_length=8)
+    status: Optional[str] = Field(None, pattern="^(active|inactive)$")
 
 class TargetCreate(BaseModel):
     user_id: str = Field(alias="userId")
@@ -322,7 +473,49 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+# bcrypt takes ~250 ms per call, so it runs on a small dedicated pool instead of the event loop
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+password_semaphore = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+password_work_stats = {
+    "queued": 0,
+    "in_flight": 0,
+    "max_queued": 0,
+    "completed": 0,
+    "rejected": 0
+}
+
+register_password_work(password_work_stats)
+
+async def run_password_work(func, *args):
+    if password_work_stats["queued"] >= PASSWORD_HASH_MAX_QUEUE:
+        password_work_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again shortly"
+        )
+    
+    password_work_stats["queued"] += 1
+    password_work_stats["max_queued"] = max(password_work_stats["max_queued"], password_work_stats["queued"])
+    try:
+        await password_semaphore.acquire()
+    finally:
+        password_work_stats["queued"] -= 1
+    
+    password_work_stats["in_flight"] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        password_work_stats["in_flight"] -= 1
+        password_work_stats["completed"] += 1
+        password_semaphore.release()
+
+async def hash_password_async(password: str) -> str:
+    return await run_password_work(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await run_password_work(verify_password, plain_password, hashed_password)
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, token_type: str = "access"):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -332,24 +525,57 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({
         "exp": expire,
         "iat": datetime.utcnow(),
-        "type": "access"
+        "type": token_type
     })
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-async def get_login_attempts(email: str) -> dict:
-    return await login_attempts_collection.find_one({"email": email}) or {
-        "email": email,
-        "attempts": 0,
-        "locked_until": None,
-        "last_attempt": None
-    }
+async def reserve_login_attempt(email: str, ip_address: str = None) -> Optional[dict]:
+    """Count a login attempt before the password is checked, in one atomic update.
 
-async def record_login_attempt(email: str, success: bool, ip_address: str = None):
+    The update only matches while the email is not locked, so returns None for a
+    locked account. An expired lock restarts the counter, and the attempt that
+    reaches MAX_LOGIN_ATTEMPTS sets locked_until, so a parallel burst can get at
+    most MAX_LOGIN_ATTEMPTS password checks. A successful login resets the counter.
+    """
     now = datetime.utcnow()
+    lock_expired = {
+        "$and": [
+            {"$ne": [{"$ifNull": ["$locked_until", None]}, None]},
+            {"$lte": ["$locked_until", now]}
+        ]
+    }
     
-    if success:
-        await login_attempts_collection.update_one(
+    try:
+        return await login_attempts_collection.find_one_and_update(
+            {"email": email, "$or": [{"locked_until": None}, {"locked_until": {"$lte": now}}]},
+            [
+                {"$set": {
+                    "attempts": {"$add": [{"$cond": [lock_expired, 0, {"$ifNull": ["$attempts", 0]}]}, 1]},
+                    "last_attempt": now,
+                    "last_ip": ip_address
+                }},
+                {"$set": {
+                    "locked_until": {
+                        "$cond": [
+                            {"$gte": ["$attempts", MAX_LOGIN_ATTEMPTS]},
+                            now + timedelta(minutes=LOCKOUT_DURATION_MINUTES),
+                            None
+                        ]
+                    }
+                }}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The email has a locked document, so the upsert tried to insert a second one
+        return None
+
+async def record_successful_login(email: str, user_id: ObjectId, ip_address: str = None):
+    now = datetime.utcnow()
+    await asyncio.gather(
+        login_attempts_collection.update_one(
             {"email": email},
             {
                 "$set": {
@@ -360,46 +586,41 @@ async def record_login_attempt(email: str, success: bool, ip_address: str = None
                 }
             },
             upsert=True
+        ),
+        users_collection.update_one(
+            {"_id": user_id},
+            {"$set": {"last_login": datetime.now().strftime("%b %d, %Y")}}
         )
-    else:
-        attempts_doc = await get_login_attempts(email)
-        new_attempts = attempts_doc["attempts"] + 1
-        
-        update_data = {
-            "attempts": new_attempts,
-            "last_attempt": now,
-            "last_ip": ip_address
-        }
-        
-        if new_attempts >= MAX_LOGIN_ATTEMPTS:
-            update_data["locked_until"] = now + timedelta(minutes=LOCKOUT_DURATION_MINUTES)
-        
-        await login_attempts_collection.update_one(
-            {"email": email},
-            {"$set": update_data},
-            upsert=True
-        )
+    )
 
-async def is_account_locked(email: str) -> bool:
-    attempts_doc = await get_login_attempts(email)
-    
-    if attempts_doc.get("locked_until"):
-        if datetime.utcnow() < attempts_doc["locked_until"]:
-            return True
-        else:
-            await login_attempts_collection.update_one(
-                {"email": email},
-                {
-                    "$set": {
-                        "attempts": 0,
-                        "locked_until": None
-                    }
-                }
-            )
-    
-    return False
+# Authenticated-user cache: user id -> (expires_at, user document without password)
+user_cache = OrderedDict()
+
+def get_cached_user(user_id: str) -> Optional[dict]:
+    entry = user_cache.get(user_id)
+    if entry is None:
+        return None
+    expires_at, user = entry
+    if time.monotonic() >= expires_at:
+        user_cache.pop(user_id, None)
+        return None
+    user_cache.move_to_end(user_id)
+    return user
+
+def cache_user(user_id: str, user: dict):
+    user = {k: v for k, v in user.items() if k != "password"}
+    user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL_SECONDS, user)
+    user_cache.move_to_end(user_id)
+    while len(user_cache) > USER_CACHE_MAX_SIZE:
+        user_cache.popitem(last=False)
+
+def invalidate_cached_user(user_id: str):
+    user_cache.pop(user_id, None)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate_token(credentials.credentials)
+
+async def authenticate_token(token: str, expected_type: str = "access") -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -407,11 +628,11 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     )
     
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id: str = payload.get("sub")
         token_type: str = payload.get("type")
         
-        if user_id is None or token_type != "access":
+        if user_id is None or token_type != expected_type:
             raise credentials_exception
             
     except jwt.ExpiredSignatureError:
@@ -423,9 +644,15 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise credentials_exception
     
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
+    user = get_cached_user(user_id)
     if user is None:
-        raise credentials_exception
+        try:
+            user = await users_collection.find_one({"_id": ObjectId(user_id)}, USER_PROJECTION)
+        except InvalidId:
+            raise credentials_exception
+        if user is None:
+            raise credentials_exception
+        cache_user(user_id, user)
     
     if user.get("status") != "active":
         raise HTTPException(
@@ -443,95 +670,198 @@ async def get_admin_user(current_user: dict = Depends(get_current_user)):
         )
     return current_user
 
+# Current field -> the legacy field older leads stored it in, and its default
+LEGACY_LEAD_FIELDS = {
+    "company_representative_name": ("first_name", ""),
+    "company_name": ("domain", ""),
+    "price_paid": ("price", 0),
+    "invoice_billed": ("clicks", 0)
+}
+
+# Set once migrate_legacy_leads has finished; until then reads fall back to legacy fields
+lead_schema_state = {"migrated": False}
+
+def update_label(created_at: Optional[str]) -> str:
+    try:
+        return datetime.fromisoformat(created_at).strftime("%b %d")
+    except (TypeError, ValueError):
+        return ""
+
+def with_legacy_fallbacks(lead: dict) -> dict:
+    """Fill current lead fields from legacy ones while the schema migration is running"""
+    if lead_schema_state["migrated"]:
+        return lead
+    lead = dict(lead)
+    for field, (legacy, default) in LEGACY_LEAD_FIELDS.items():
+        if legacy in lead or not lead.get(field):
+            lead[field] = lead.get(field) or lead.get(legacy) or default
+    if "update" not in lead and "created_at" in lead:
+        lead["update"] = update_label(lead["created_at"])
+    return lead
+
+def lead_amount_expr(field: str) -> dict:
+    """Aggregation value of price_paid / invoice_billed; missing/None counts as 0"""
+    if lead_schema_state["migrated"]:
+        return {"$ifNull": [f"${field}", 0]}
+    # Same rule as with_legacy_fallbacks: a falsy current value (missing, None, 0)
+    # falls back to the legacy one, so list, deltas and reports agree
+    legacy = LEGACY_LEAD_FIELDS[field][0]
+    return {"$cond": [f"${field}", f"${field}", {"$ifNull": [f"${legacy}", 0]}]}
+
+def build_achievements_pipeline(user_ids: list) -> list:
+    """Sales and invoice totals per assigned user"""
+    return [
+        {"$match": {"assigned_to": {"$in": user_ids}}},
+        {"$group": {
+            "_id": "$assigned_to",
+            "sales_achieved": {"$sum": lead_amount_expr("price_paid")},
+            "invoice_achieved": {"$sum": lead_amount_expr("invoice_billed")}
+        }}
+    ]
+
 async def calculate_user_achievements(user_id: str):
-    user_leads = await leads_collection.find({"assigned_to": user_id}).to_list(None)
+    results = await leads_collection.aggregate(build_achievements_pipeline([user_id])).to_list(1)
     
-    # Handle None values properly by using or 0 to ensure we always have numbers
-    sales_achieved = sum((lead.get("price_paid") or 0) for lead in user_leads)
-    invoice_achieved = sum((lead.get("invoice_billed") or 0) for lead in user_leads)
-    
-    return sales_achieved, invoice_achieved
+    if not results:
+        return 0, 0
+    return results[0]["sales_achieved"], results[0]["invoice_achieved"]
 
 async def update_user_targets_achievements(user_id: str):
-    sales_achieved, invoice_achieved = await calculate_user_achievements(user_id)
+    await recompute_users_achievements([user_id])
+
+async def recompute_users_achievements(user_ids):
+    """Recompute achievements for many users with one aggregation and one bulk write"""
+    user_ids = [user_id for user_id in set(user_ids) if user_id]
+    if not user_ids:
+        return
     
-    await targets_collection.update_one(
-        {"user_id": user_id},
-        {
-            "$set": {
-                "sales_achieved": sales_achieved,
-                "invoice_achieved": invoice_achieved,
-                "updated_at": datetime.utcnow().isoformat()
-            }
-        },
-        upsert=False
-    )
+    totals = {
+        row["_id"]: row
+        for row in await leads_collection.aggregate(build_achievements_pipeline(user_ids)).to_list(None)
+    }
+    
+    now = datetime.utcnow().isoformat()
+    operations = [
+        UpdateOne(
+            {"user_id": user_id},
+            {
+                "$set": {
+                    "sales_achieved": totals.get(user_id, {}).get("sales_achieved", 0),
+                    "invoice_achieved": totals.get(user_id, {}).get("invoice_achieved", 0),
+                    "updated_at": now
+                }
+            },
+            upsert=False
+        )
+        for user_id in user_ids
+    ]
+    await targets_collection.bulk_write(operations, ordered=False)
+
+def lead_achievement_values(lead: dict) -> tuple:
+    lead = with_legacy_fallbacks(lead)
+    return (lead.get("price_paid") or 0), (lead.get("invoice_billed") or 0)
+
+async def apply_achievement_deltas(old_lead: Optional[dict], new_lead: Optional[dict]):
+    """Adjust target achievements by the difference between two versions of a lead.
+
+    Pass None as old_lead for a created lead and as new_lead for a deleted one.
+    Any drift from concurrent writes is corrected by reconcile_target_achievements.
+    """
+    deltas = {}
+    for lead, sign in ((old_lead, -1), (new_lead, 1)):
+        if lead and lead.get("assigned_to"):
+            sales, invoice = lead_achievement_values(lead)
+            user_delta = deltas.setdefault(lead["assigned_to"], [0, 0])
+            user_delta[0] += sign * sales
+            user_delta[1] += sign * invoice
+    
+    for user_id, (sales_delta, invoice_delta) in deltas.items():
+        if not sales_delta and not invoice_delta:
+            continue
+        await targets_collection.update_one(
+            {"user_id": user_id},
+            {
+                "$inc": {
+                    "sales_achieved": sales_delta,
+                    "invoice_achieved": invoice_delta
+                },
+                "$set": {"updated_at": datetime.utcnow().isoformat()}
+            },
+            upsert=False
+        )
+
+async def reconcile_target_achievements():
+    """Recompute every target's achievements from the leads to correct counter drift"""
+    user_ids = await targets_collection.distinct("user_id")
+    await recompute_users_achievements(user_ids)
+    return len(user_ids)
+
+async def achievement_reconciliation_loop():
+    while True:
+        await asyncio.sleep(ACHIEVEMENT_RECONCILE_INTERVAL_MINUTES * 60)
+        try:
+            count = await reconcile_target_achievements()
+            logger.info("Reconciled target achievements", extra={"users": count})
+        except Exception:
+            logger.exception("Achievement reconciliation failed")
 
 # Fixed: Added missing format_user_response function
 def format_user_response(user: dict) -> dict:
     return {
         "id": str(user["_id"]),
-        "name": user["name"],
-        "email": user["email"],
-        "role": user["role"],
+        "name": user.get("name"),
+        "email": user.get("email"),
+        "role": user.get("role"),
         "status": user.get("status", "active"),
         "last_login": user.get("last_login"),
         "phone_number": user.get("phone_number"),
         "created_at": user.get("created_at")
     }
 
-# FIXED BACKWARD-COMPATIBLE FORMAT LEAD RESPONSE FUNCTION
 def format_lead_response(lead: dict) -> dict:
-    """Format lead response - backward compatible with old and new field formats"""
+    """Format lead response; legacy field names are rewritten by migrate_legacy_leads"""
+    lead = with_legacy_fallbacks(lead)
     return {
         "id": str(lead["_id"]),
-        # Handle both old and new field names with fallbacks
-        "companyRepresentativeName": (
-            lead.get("company_representative_name") or 
-            lead.get("first_name") or 
-            ""
-        ),
-        "companyName": (
-            lead.get("company_name") or 
-            lead.get("domain") or 
-            ""
-        ),
-        "email": lead["email"],
+        "companyRepresentativeName": lead.get("company_representative_name", ""),
+        "companyName": lead.get("company_name", ""),
+        "email": lead.get("email"),
         "phone": lead.get("phone"),
-        "source": lead["source"],
-        "pricePaid": (
-            lead.get("price_paid") or 
-            lead.get("price") or 
-            0
-        ),
-        "invoiceBilled": (
-            lead.get("invoice_billed") or 
-            lead.get("clicks") or 
-            0
-        ),
-        "status": lead["status"],
+        "source": lead.get("source"),
+        "pricePaid": lead.get("price_paid", 0),
+        "invoiceBilled": lead.get("invoice_billed", 0),
+        "status": lead.get("status"),
         "assignedTo": lead.get("assigned_to"),
         "brand": lead.get("brand"),
         "product": lead.get("product"), 
         "location": lead.get("location"),
         "notes": lead.get("notes"),
-        "update": lead.get("update", datetime.now().strftime("%b %d")),
-        "createdAt": lead["created_at"]
+        "update": lead.get("update", ""),
+        "createdAt": lead.get("created_at")
     }
 
 def format_target_response(target: dict) -> dict:
     return {
         "id": str(target["_id"]),
-        "userId": target["user_id"],
-        "salesTarget": target["sales_target"],
-        "invoiceTarget": target["invoice_target"],
+        "userId": target.get("user_id"),
+        "salesTarget": target.get("sales_target"),
+        "invoiceTarget": target.get("invoice_target"),
         "salesAchieved": target.get("sales_achieved", 0),
         "invoiceAchieved": target.get("invoice_achieved", 0),
-        "period": target["period"],
-        "createdAt": target["created_at"],
-        "updatedAt": target["updated_at"]
+        "period": target.get("period"),
+        "createdAt": target.get("created_at"),
+        "updatedAt": target.get("updated_at")
     }
 
+def event_interval(date: str, time_value: str, duration: int) -> tuple:
+    """Start and end as naive UTC for an event's date, HH:MM time and duration in minutes.
+
+    The date and time are wall-clock values in CALENDAR_TIMEZONE.
+    """
+    local_start = datetime.strptime(f"{date} {time_value[:5]}", "%Y-%m-%d %H:%M").replace(tzinfo=CALENDAR_TIMEZONE)
+    start = local_start.astimezone(timezone.utc).replace(tzinfo=None)
+    return start, start + timedelta(minutes=duration)
+
 def format_calendar_event_response(event: dict) -> dict:
     contact = None
     if event.get("contact_name") or event.get("contact_email") or event.get("contact_phone"):
@@ -543,35 +873,37 @@ def format_calendar_event_response(event: dict) -> dict:
     
     return {
         "id": str(event["_id"]),
-        "title": event["title"],
-        "type": event["type"],
-        "date": event["date"],
-        "time": event["time"],
-        "duration": event["duration"],
+        "title": event.get("title"),
+        "type": event.get("type"),
+        "date": event.get("date"),
+        "time": event.get("time"),
+        "duration": event.get("duration"),
         "description": event.get("description"),
         "contact": contact,
         "location": event.get("location"),
-        "status": event["status"],
-        "priority": event["priority"],
-        "createdAt": event["created_at"],
-        "updatedAt": event["updated_at"],
-        "userId": event["user_id"]
+        "status": event.get("status"),
+        "priority": event.get("priority"),
+        "start": event["start"].isoformat() if event.get("start") else None,
+        "end": event["end"].isoformat() if event.get("end") else None,
+        "createdAt": event.get("created_at"),
+        "updatedAt": event.get("updated_at"),
+        "userId": event.get("user_id")
     }
 
 def format_task_response(task: dict) -> dict:
     return {
         "id": str(task["_id"]),
-        "title": task["title"],
+        "title": task.get("title"),
         "description": task.get("description"),
-        "dueDate": task["due_date"],
-        "priority": task["priority"],
-        "status": task["status"],
-        "category": task["category"],
+        "dueDate": task.get("due_date"),
+        "priority": task.get("priority"),
+        "status": task.get("status"),
+        "category": task.get("category"),
         "assignedTo": task.get("assigned_to"),
         "relatedLead": task.get("related_lead"),
-        "createdAt": task["created_at"],
-        "updatedAt": task["updated_at"],
-        "userId": task["user_id"]
+        "createdAt": task.get("created_at"),
+        "updatedAt": task.get("updated_at"),
+        "userId": task.get("user_id")
     }
 
 def serialize_doc(doc):
@@ -609,39 +941,1064 @@ def format_management_response(item: dict) -> dict:
             formatted[key] = value
     return formatted
 
+# Sparse fieldsets: each response field and the document fields it is built from
+USER_FIELDS = {
+    "id": [],
+    "name": ["name"],
+    "email": ["email"],
+    "role": ["role"],
+    "status": ["status"],
+    "last_login": ["last_login"],
+    "phone_number": ["phone_number"],
+    "created_at": ["created_at"]
+}
+
+LEAD_FIELDS = {
+    "id": [],
+    # legacy sources only exist on leads migrate_legacy_leads has not reached yet
+    "companyRepresentativeName": ["company_representative_name", "first_name"],
+    "companyName": ["company_name", "domain"],
+    "email": ["email"],
+    "phone": ["phone"],
+    "source": ["source"],
+    "pricePaid": ["price_paid", "price"],
+    "invoiceBilled": ["invoice_billed", "clicks"],
+    "status": ["status"],
+    "assignedTo": ["assigned_to"],
+    "brand": ["brand"],
+    "product": ["product"],
+    "location": ["location"],
+    "notes": ["notes"],
+    "update": ["update", "created_at"],
+    "createdAt": ["created_at"]
+}
+
+TARGET_FIELDS = {
+    "id": [],
+    "userId": ["user_id"],
+    "salesTarget": ["sales_target"],
+    "invoiceTarget": ["invoice_target"],
+    "salesAchieved": ["sales_achieved"],
+    "invoiceAchieved": ["invoice_achieved"],
+    "period": ["period"],
+    "createdAt": ["created_at"],
+    "updatedAt": ["updated_at"]
+}
+
+CALENDAR_EVENT_FIELDS = {
+    "id": [],
+    "title": ["title"],
+    "type": ["type"],
+    "date": ["date"],
+    "time": ["time"],
+    "duration": ["duration"],
+    "description": ["description"],
+    "contact": ["contact_name", "contact_email", "contact_phone"],
+    "location": ["location"],
+    "status": ["status"],
+    "priority": ["priority"],
+    "start": ["start"],
+    "end": ["end"],
+    "createdAt": ["created_at"],
+    "updatedAt": ["updated_at"],
+    "userId": ["user_id"]
+}
+
+TASK_FIELDS = {
+    "id": [],
+    "title": ["title"],
+    "description": ["description"],
+    "dueDate": ["due_date"],
+    "priority": ["priority"],
+    "status": ["status"],
+    "category": ["category"],
+    "assignedTo": ["assigned_to"],
+    "relatedLead": ["related_lead"],
+    "createdAt": ["created_at"],
+    "updatedAt": ["updated_at"],
+    "userId": ["user_id"]
+}
+
+def build_projection(field_map: dict, names=None) -> dict:
+    """Mongo projection reading only the document fields behind ``names``"""
+    projection = {source: 1 for name in (names or field_map) for source in field_map[name]}
+    return projection or {"_id": 1}
+
+# Everything format_user_response needs and never the password hash
+USER_PROJECTION = build_projection(USER_FIELDS)
+
+def parse_fields(fields: Optional[str], field_map: dict) -> tuple:
+    """Turn ``fields=companyName,pricePaid`` into (selected names, projection).
+
+    The id is always returned. Without the parameter every field is selected.
+    """
+    if not fields:
+        return None, build_projection(field_map)
+    
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in field_map]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    selected = ["id"] + [name for name in dict.fromkeys(names) if name != "id"]
+    return selected, build_projection(field_map, selected)
+
+def select_fields(formatter, selected: Optional[List[str]]):
+    """Wrap a format_* function so it only emits the selected fields"""
+    if selected is None:
+        return formatter
+    
+    def format_selected(doc: dict) -> dict:
+        formatted = formatter(doc)
+        return {name: formatted[name] for name in selected}
+    return format_selected
+
+# Lead list filtering and keyset pagination
+LEAD_SORT_FIELDS = {
+    "createdAt": "created_at",
+    "companyName": "company_name",
+    "pricePaid": "price_paid",
+    "invoiceBilled": "invoice_billed",
+    "status": "status"
+}
+
+def parse_datetime_param(value: str, upper: bool = False) -> datetime:
+    """Parse a YYYY-MM-DD or ISO datetime query parameter as naive UTC.
+
+    Values with an offset (``...Z``, ``+02:00``) are converted to UTC; values
+    without one are taken as UTC already, matching the stored datetimes.
+    Date-only upper bounds are pushed to the start of the next day so the
+    whole day is included when compared with ``$lt``.
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    if upper and len(value) == 10:
+        parsed = parsed + timedelta(days=1)
+    return parsed
+
+def parse_date_bound(value: str, upper: bool = False) -> str:
+    """Turn a date parameter into a bound for the created_at string"""
+    return parse_datetime_param(value, upper).isoformat()
+
+TASK_SORT_FIELDS = {
+    "dueDate": "due_date",
+    "createdAt": "created_at"
+}
+
+TASK_FACET_FIELDS = {
+    "status": "status",
+    "priority": "priority",
+    "category": "category"
+}
+
+def get_task_filters(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    priority: Optional[str] = None,
+    category: Optional[str] = None,
+    related_lead: Optional[str] = Query(None, alias="relatedLead"),
+    due_from: Optional[str] = Query(None, alias="dueFrom"),
+    due_to: Optional[str] = Query(None, alias="dueTo")
+) -> tuple:
+    """Split the task list parameters into facet filters and base filters.
+
+    Facet counts are computed over the base filters only, so picking a status
+    does not collapse the counts of the other statuses to zero.
+    """
+    facet_filters = {}
+    for field, value in (("status", status_filter), ("priority", priority), ("category", category)):
+        if value:
+            facet_filters[field] = value
+    
+    base_filters = {}
+    if related_lead:
+        base_filters["related_lead"] = related_lead
+    due_range = {}
+    if due_from:
+        due_range["$gte"] = due_from
+    if due_to:
+        due_range["$lte"] = due_to
+    if due_range:
+        base_filters["due_date"] = due_range
+    
+    return base_filters, facet_filters
+
+def build_task_facets_pipeline(query: dict) -> list:
+    return [
+        {"$match": query},
+        {"$facet": {
+            name: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+            for name, field in TASK_FACET_FIELDS.items()
+        }}
+    ]
+
+def format_task_facets(result: dict) -> dict:
+    return {
+        name: {row["_id"]: row["count"] for row in result.get(name, []) if row["_id"]}
+        for name in TASK_FACET_FIELDS
+    }
+
+def build_created_range(created_from: Optional[str], created_to: Optional[str]) -> dict:
+    """Filter on the created_at string for an optional date range"""
+    created_range = {}
+    if created_from:
+        created_range["$gte"] = parse_date_bound(created_from)
+    if created_to:
+        created_range["$lt" if len(created_to) == 10 else "$lte"] = parse_date_bound(created_to, upper=True)
+    return {"created_at": created_range} if created_range else {}
+
+def get_lead_filters(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    source: Optional[str] = None,
+    assigned_to: Optional[str] = Query(None, alias="assignedTo"),
+    brand: Optional[str] = None,
+    product: Optional[str] = None,
+    location: Optional[str] = None,
+    created_from: Optional[str] = Query(None, alias="createdFrom"),
+    created_to: Optional[str] = Query(None, alias="createdTo")
+) -> dict:
+    """Build a Mongo filter from the lead list query parameters"""
+    query = {}
+    for field, value in (
+        ("status", status_filter),
+        ("source", source),
+        ("assigned_to", assigned_to),
+        ("brand", brand),
+        ("product", product),
+        ("location", location)
+    ):
+        if value:
+            query[field] = value
+
+    query.update(build_created_range(created_from, created_to))
+    return query
+
+def scope_leads_query(query: dict, current_user: dict) -> dict:
+    """Restrict a lead query to the leads the current user may see"""
+    if current_user.get("role") != "admin":
+        query = {**query, "assigned_to": str(current_user["_id"])}
+    return query
+
+def parse_sort(sort: str, sort_fields: dict = LEAD_SORT_FIELDS) -> tuple:
+    """Parse ``createdAt`` / ``-createdAt`` style sort parameters"""
+    direction = -1 if sort.startswith("-") else 1
+    field = sort_fields.get(sort.lstrip("-"))
+    if not field:
+        raise HTTPException(status_code=400, detail=f"Invalid sort field: {sort}")
+    return field, direction
+
+def encode_cursor(doc: dict, sort_field: str, direction: int) -> str:
+    payload = {"v": doc.get(sort_field), "id": str(doc["_id"]), "s": sort_field, "d": direction}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, sort_field: str, direction: int) -> dict:
+    """Turn an opaque cursor into the keyset condition for the next page"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        last_id = ObjectId(payload["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if payload.get("s") != sort_field or payload.get("d") != direction:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort")
+
+    op = "$gt" if direction == 1 else "$lt"
+    value = payload["v"]
+    # null/missing sort before every other value: they open an ascending list
+    # and close a descending one, and {$gt: null} / {$lt: v} never match them
+    if value is None:
+        after = [{sort_field: {"$ne": None}}] if direction == 1 else []
+    else:
+        after = [{sort_field: {op: value}}] + ([{sort_field: None}] if direction == -1 else [])
+    return {"$or": after + [{sort_field: value, "_id": {op: last_id}}]}
+
+def keyset_query(query: dict, sort_field: str, direction: int, cursor: Optional[str] = None) -> dict:
+    """The filter for one page: ``query`` narrowed to the rows after ``cursor``"""
+    if not cursor:
+        return query
+    return {"$and": [query, decode_cursor(cursor, sort_field, direction)]}
+
+async def fetch_page(collection, query: dict, sort_field: str, direction: int,
+                     limit: int, cursor: Optional[str] = None, projection: Optional[dict] = None) -> tuple:
+    """Fetch one keyset page, returning the documents and the next cursor"""
+    query = keyset_query(query, sort_field, direction, cursor)
+    if projection is not None:
+        # the next cursor is built from the last document's sort value
+        projection = {**projection, sort_field: 1}
+
+    docs = await collection.find(query, projection).sort(
+        [(sort_field, direction), ("_id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1], sort_field, direction)
+    return docs, next_cursor
+
+# Duplicate lead detection
+def canonical_email(email: Optional[str]) -> str:
+    """Lower-case and drop a ``+tag`` from the local part"""
+    local, _, domain = (email or "").strip().lower().partition("@")
+    return f"{local.split('+', 1)[0]}@{domain}" if domain else local
+
+def canonical_phone(phone: Optional[str]) -> str:
+    return re.sub(r"\D", "", phone or "")
+
+def fold_company_name(name: Optional[str]) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", (name or "").casefold()).split())
+
+def build_dedupe_key(email: Optional[str], phone: Optional[str], company_name: Optional[str]) -> str:
+    return "|".join((canonical_email(email), canonical_phone(phone), fold_company_name(company_name)))
+
+def lead_dedupe_key(lead: dict) -> str:
+    return build_dedupe_key(lead.get("email"), lead.get("phone"), lead.get("company_name"))
+
+async def find_duplicate_lead(dedupe_key: str, exclude_id: Optional[ObjectId] = None) -> Optional[dict]:
+    query = {"dedupe_key": dedupe_key}
+    if exclude_id is not None:
+        query["_id"] = {"$ne": exclude_id}
+    return await leads_collection.find_one(query, {"_id": 1})
+
+async def ensure_not_duplicate(dedupe_key: str, exclude_id: Optional[ObjectId] = None):
+    duplicate = await find_duplicate_lead(dedupe_key, exclude_id)
+    if duplicate:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"A lead with the same email, phone and company already exists ({duplicate['_id']})"
+        )
+
+# Lead search
+MAX_SEARCH_OFFSET = 1000
+
+def build_search_terms(q: str) -> str:
+    """Reduce a search box value to plain words for ``$text``.
+
+    Quotes and leading hyphens are operators in ``$search``; a phone number
+    like ``555-1234`` would otherwise exclude every lead containing ``1234``.
+    """
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query must contain letters or digits")
+    return " ".join(terms)
+
+def encode_offset_cursor(offset: int) -> str:
+    raw = json.dumps({"o": offset}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_offset_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        offset = int(json.loads(raw)["o"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if offset < 0 or offset > MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+# NDJSON streaming for large list responses
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def stream_ndjson(cursor, formatter) -> StreamingResponse:
+    """Stream a Motor cursor as newline-delimited JSON, one batch at a time"""
+    cursor.batch_size(STREAM_BATCH_SIZE)
+
+    async def generate():
+        lines = []
+        async for doc in cursor:
+            lines.append(orjson.dumps(formatter(doc), default=json_default))
+            if len(lines) >= STREAM_BATCH_SIZE:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
+
+# Report aggregation
+
+def build_report_summary_pipeline(query: dict) -> list:
+    """Single $facet pipeline behind the dashboard and report charts"""
+    is_converted = {"$eq": ["$status", "converted"]}
+    revenue = lead_amount_expr("price_paid")
+    return [
+        {"$match": query},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "totalLeads": {"$sum": 1},
+                    "convertedLeads": {"$sum": {"$cond": [is_converted, 1, 0]}},
+                    "revenue": {"$sum": {"$cond": [is_converted, revenue, 0]}},
+                    "invoiced": {"$sum": {"$cond": [is_converted, lead_amount_expr("invoice_billed"), 0]}}
+                }}
+            ],
+            "byStatus": [
+                {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+            ],
+            "bySource": [
+                {"$group": {"_id": "$source", "count": {"$sum": 1}}}
+            ],
+            "bySalesperson": [
+                {"$match": {"assigned_to": {"$nin": [None, ""]}}},
+                {"$group": {
+                    "_id": "$assigned_to",
+                    "leads": {"$sum": 1},
+                    "converted": {"$sum": {"$cond": [is_converted, 1, 0]}},
+                    "revenue": {"$sum": {"$cond": [is_converted, revenue, 0]}}
+                }},
+                {"$sort": {"revenue": -1}}
+            ]
+        }}
+    ]
+
+def format_report_summary(result: dict) -> dict:
+    totals = result["totals"][0] if result["totals"] else {}
+    total_leads = totals.get("totalLeads", 0)
+    converted_leads = totals.get("convertedLeads", 0)
+
+    return {
+        "totalLeads": total_leads,
+        "convertedLeads": converted_leads,
+        "conversionRate": round(converted_leads / total_leads * 100, 1) if total_leads else 0,
+        "revenue": totals.get("revenue", 0),
+        "invoiced": totals.get("invoiced", 0),
+        "statusCounts": {row["_id"]: row["count"] for row in result["byStatus"] if row["_id"]},
+        "sourceCounts": {row["_id"]: row["count"] for row in result["bySource"] if row["_id"]},
+        "salespeople": [
+            {
+                "userId": row["_id"],
+                "leads": row["leads"],
+                "converted": row["converted"],
+                "revenue": row["revenue"],
+                "conversionRate": round(row["converted"] / row["leads"] * 100, 1) if row["leads"] else 0
+            }
+            for row in result["bySalesperson"]
+        ]
+    }
+
+# Conditional GET helpers
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+def compute_etag(payload) -> str:
+    digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same validator
+    bare_etag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare_etag:
+            return True
+    return False
+
+def not_modified_response(etag: str) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    apply_etag_headers(response, etag)
+    return response
+
+def json_response(content: dict, etag: Optional[str] = None) -> FastJSONResponse:
+    """Return a body that is already JSON-safe without FastAPI's jsonable_encoder pass"""
+    response = FastJSONResponse(content)
+    if etag:
+        apply_etag_headers(response, etag)
+    return response
+
+def apply_etag_headers(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+    response.headers["Vary"] = "Accept, Authorization"
+
+# Change generations: a counter per collection and owner ("leads:<user id>"), plus
+# "<collection>:*" for admin-wide views. Kept in Mongo so every worker sees the same value.
+async def bump_generations(collection_name: str, owners):
+    keys = {f"{collection_name}:*"} | {f"{collection_name}:{owner}" for owner in owners if owner}
+    await change_generations_collection.bulk_write([
+        UpdateOne(
+            {"_id": key},
+            {"$inc": {"generation": 1}, "$setOnInsert": {"epoch": secrets.token_hex(4)}},
+            upsert=True
+        )
+        for key in keys
+    ], ordered=False)
+
+async def read_generation(collection_name: str, owner: Optional[str] = None) -> str:
+    doc = await change_generations_collection.find_one({"_id": f"{collection_name}:{owner or '*'}"})
+    return f"{doc['epoch']}.{doc['generation']}" if doc else "0"
+
+async def get_list_etag(request: Request, collection_name: str, owner: Optional[str]) -> str:
+    """Weak ETag for a list view: owner generation plus the query parameters and Accept header"""
+    generation = await read_generation(collection_name, owner)
+    variant = hashlib.sha1(
+        f"{sorted(request.query_params.multi_items())}|{request.headers.get('accept', '')}".encode()
+    ).hexdigest()[:12]
+    return f'W/"{collection_name}-{generation}-{variant}"'
+
+# Reference data cache for the management lookup collections.
+# The version is the "<item type>:*" change generation, so a write in any worker
+# invalidates every worker's snapshot; the TTL covers writes made outside the API.
+reference_snapshots = {}
+
+async def bump_reference_version(item_type: str):
+    await bump_generations(item_type, [])
+    reference_snapshots.pop(item_type, None)
+
+async def get_reference_snapshot(item_type: str) -> dict:
+    snapshot = reference_snapshots.get(item_type)
+    now = time.monotonic()
+    if snapshot and now < snapshot["expires_at"]:
+        # Bulk paths such as import validate many rows, so the version is re-read at most once a second
+        if now < snapshot["checked_at"] + REFERENCE_VERSION_CHECK_SECONDS:
+            return snapshot
+        if snapshot["version"] == await read_generation(item_type):
+            snapshot["checked_at"] = now
+            return snapshot
+    
+    version = await read_generation(item_type)
+    items = await MANAGEMENT_COLLECTIONS[item_type].find({}).to_list(None)
+    formatted = [format_management_response(item) for item in items]
+    snapshot = {
+        "version": version,
+        "items": formatted,
+        "names": {item["name"] for item in formatted if item.get("name")},
+        "etag": compute_etag(formatted),
+        "checked_at": time.monotonic(),
+        "expires_at": time.monotonic() + REFERENCE_CACHE_TTL_SECONDS
+    }
+    reference_snapshots[item_type] = snapshot
+    return snapshot
+
+async def validate_lead_references(lead_data: dict):
+    """Reject unknown brand/product/location values when STRICT_LEAD_REFERENCES is on"""
+    if not STRICT_LEAD_REFERENCES:
+        return
+    for field, item_type in (("brand", "brands"), ("product", "products"), ("location", "locations")):
+        value = lead_data.get(field)
+        if value and value not in (await get_reference_snapshot(item_type))["names"]:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown {field}: {value}"
+            )
+
+# Change notifications: in-process pub/sub feeding the /events/stream SSE endpoint.
+# With CHANGE_STREAM_EVENTS the Mongo change stream is the only source, so every
+# worker sees writes made by the others; handlers then skip local publishing.
+# The stream is only used once enable_change_stream_events has checked the server.
+change_subscribers = set()
+change_stream_state = {"active": False}
+
+CHANGE_OWNER_FIELDS = {
+    "leads": "assigned_to",
+    "tasks": "user_id",
+    "calendar_events": "user_id"
+}
+
+IGNORED_CHANGE_FIELDS = {"updated_at", "updated_by", "update", "dedupe_key"}
+
+def to_camel(field: str) -> str:
+    head, *rest = field.split("_")
+    return head + "".join(part.capitalize() for part in rest)
+
+def changed_fields(fields) -> List[str]:
+    return sorted(to_camel(field) for field in fields if field not in IGNORED_CHANGE_FIELDS)
+
+def can_see_change(subscriber: dict, collection_name: str, owners) -> bool:
+    # Admins see every lead; tasks and events are only ever visible to their owner
+    if collection_name == "leads" and subscriber["role"] == "admin":
+        return True
+    return subscriber["user_id"] in owners
+
+def deliver_change(subscriber: dict, event: dict):
+    try:
+        subscriber["queue"].put_nowait(event)
+    except asyncio.QueueFull:
+        # The client fell behind; tell it to refetch instead of growing the queue
+        subscriber["overflowed"] = True
+
+def publish_change(collection_name: str, op: str, changes, fields=None, from_change_stream: bool = False):
+    """Notify subscribers about changed documents.
+
+    ``changes`` is a list of (document id, owner ids) pairs; each subscriber only
+    receives the ids it is allowed to see.
+    """
+    if change_stream_state["active"] and not from_change_stream:
+        return
+    
+    for subscriber in list(change_subscribers):
+        visible = [str(doc_id) for doc_id, owners in changes if can_see_change(subscriber, collection_name, owners)]
+        if not visible:
+            continue
+        event = {"collection": collection_name, "op": op}
+        if len(changes) == 1:
+            event["id"] = visible[0]
+        else:
+            event["ids"] = visible
+        if fields:
+            event["fields"] = fields
+        deliver_change(subscriber, event)
+
+async def enable_change_stream_events() -> bool:
+    """Check the server supports CHANGE_STREAM_EVENTS and turn on pre-images.
+
+    Owners of deleted or reassigned documents only exist in the pre-image, which
+    needs MongoDB 6.0+ and changeStreamPreAndPostImages on each collection. When
+    any of that is missing, changes keep being published locally by each worker.
+    """
+    try:
+        hello = await client.admin.command("hello")
+        if "setName" not in hello and hello.get("msg") != "isdbgrid":
+            logger.error("CHANGE_STREAM_EVENTS needs a replica set or sharded cluster; publishing changes locally")
+            return False
+        version = (await client.server_info())["versionArray"]
+        if version[:2] < [6, 0]:
+            logger.error("CHANGE_STREAM_EVENTS needs MongoDB 6.0 or newer; publishing changes locally")
+            return False
+        # ensure_indexes has already created the collections
+        for collection_name in CHANGE_OWNER_FIELDS:
+            await db.command({"collMod": collection_name, "changeStreamPreAndPostImages": {"enabled": True}})
+    except OperationFailure as e:
+        logger.error("Could not enable change stream pre-images, publishing changes locally: %s", e)
+        return False
+    
+    change_stream_state["active"] = True
+    return True
+
+async def watch_change_stream():
+    """Publish lead, task and calendar changes from the Mongo change stream (replica sets only)"""
+    op_names = {"insert": "create", "update": "update", "replace": "update", "delete": "delete"}
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": list(CHANGE_OWNER_FIELDS)},
+        "operationType": {"$in": list(op_names)}
+    }}]
+    
+    while True:
+        try:
+            async with db.watch(
+                pipeline,
+                full_document="updateLookup",
+                full_document_before_change="whenAvailable"
+            ) as stream:
+                async for change in stream:
+                    collection_name = change["ns"]["coll"]
+                    owner_field = CHANGE_OWNER_FIELDS[collection_name]
+                    owners = {
+                        (change.get(key) or {}).get(owner_field)
+                        for key in ("fullDocument", "fullDocumentBeforeChange")
+                    }
+                    description = change.get("updateDescription") or {}
+                    fields = changed_fields(
+                        list(description.get("updatedFields", {})) + description.get("removedFields", [])
+                    )
+                    publish_change(
+                        collection_name,
+                        op_names[change["operationType"]],
+                        [(change["documentKey"]["_id"], owners - {None})],
+                        fields,
+                        from_change_stream=True
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Change stream error, retrying: %s", e)
+            await asyncio.sleep(5)
+
+# Bulk lead import
+def iter_import_rows(upload: UploadFile, file_format: str):
+    """Yield raw rows from an uploaded CSV or NDJSON file one at a time.
+
+    Starlette spools uploads to disk, so reading row by row keeps memory flat.
+    Unparseable NDJSON lines are yielded as ValueError instances.
+    """
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        if file_format == "csv":
+            yield from csv.DictReader(text)
+        else:
+            for line in text:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield ValueError("Invalid JSON")
+                    continue
+                yield row if isinstance(row, dict) else ValueError("Each line must be a JSON object")
+    finally:
+        text.detach()
+
+def read_import_chunk(rows, first_row: int, created_by: str, size: int = IMPORT_BATCH_SIZE) -> tuple:
+    """Read and validate up to ``size`` rows; blocking, so run it in a worker thread.
+
+    Returns (parsed, file_error, exhausted). ``parsed`` holds (row_number, document)
+    pairs, with a list of error messages in place of the document for invalid rows.
+    A file that is not UTF-8 or not valid CSV stops the import with ``file_error``.
+    """
+    parsed = []
+    try:
+        for row in itertools.islice(rows, size):
+            row_number = first_row + len(parsed)
+            if isinstance(row, ValueError):
+                parsed.append((row_number, [str(row)]))
+                continue
+            try:
+                document = build_lead_document(LeadCreate(**clean_import_row(row)), created_by)
+            except ValidationError as e:
+                parsed.append((row_number, format_validation_errors(e)))
+                continue
+            document["_id"] = ObjectId()
+            document["imported"] = True
+            parsed.append((row_number, document))
+    except UnicodeDecodeError:
+        return parsed, f"Row {first_row + len(parsed)}: file is not valid UTF-8", True
+    except csv.Error as e:
+        return parsed, f"Row {first_row + len(parsed)}: malformed CSV ({e})", True
+    return parsed, None, len(parsed) < size
+
+def clean_import_row(row: dict) -> dict:
+    # Blank cells mean "not provided" so model defaults apply
+    return {
+        key.strip(): value.strip() if isinstance(value, str) else value
+        for key, value in row.items()
+        if key and value not in ("", None)
+    }
+
+def format_validation_errors(exc: ValidationError) -> List[str]:
+    return [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()]
+
+# Lead export
+EXPORT_COLUMNS = [
+    "id", "companyRepresentativeName", "companyName", "email", "phone", "source",
+    "pricePaid", "invoiceBilled", "status", "assignedTo", "brand", "product",
+    "location", "notes", "createdAt"
+]
+
+EXPORT_PROJECTION = build_projection(LEAD_FIELDS)
+
+def export_row(lead: dict) -> list:
+    formatted = format_lead_response(lead)
+    return [formatted.get(column) for column in EXPORT_COLUMNS]
+
+async def stream_leads_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    rows = 0
+    async for lead in cursor:
+        writer.writerow(export_row(lead))
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+async def build_leads_xlsx(cursor) -> str:
+    """Write leads to a temporary XLSX file and return its path"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Leads")
+    sheet.append(EXPORT_COLUMNS)
+    async for lead in cursor:
+        sheet.append(export_row(lead))
+    
+    handle, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(handle)
+    await asyncio.to_thread(workbook.save, path)
+    return path
+
+async def stream_file(path: str, chunk_size: int = 64 * 1024):
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+    finally:
+        os.remove(path)
+
+# Calendar scheduling helpers
+def overlapping_events_query(user_ids, start: datetime, end: datetime, exclude_id: Optional[ObjectId] = None) -> dict:
+    query = {
+        "user_id": {"$in": list(user_ids)},
+        "start": {"$gte": start - timedelta(minutes=MAX_EVENT_DURATION_MINUTES), "$lt": end},
+        "end": {"$gt": start},
+        "status": {"$ne": "cancelled"}
+    }
+    if exclude_id:
+        query["_id"] = {"$ne": exclude_id}
+    return query
+
+async def find_overlapping_events(user_ids, start: datetime, end: datetime,
+                                  exclude_id: Optional[ObjectId] = None, projection: Optional[dict] = None) -> list:
+    """Non-cancelled events of the given users that overlap [start, end)"""
+    query = overlapping_events_query(user_ids, start, end, exclude_id)
+    return await calendar_events_collection.find(query, projection).sort("start", ASCENDING).to_list(None)
+
+def calendar_events_query(user_id: str, range_from: Optional[str] = None, range_to: Optional[str] = None) -> dict:
+    """A user's events, optionally only those overlapping the from/to window"""
+    query = {"user_id": user_id}
+    if range_from:
+        window_start = parse_datetime_param(range_from)
+        # Bounding start by the longest allowed duration keeps the index scan tight
+        query["start"] = {"$gte": window_start - timedelta(minutes=MAX_EVENT_DURATION_MINUTES)}
+        query["end"] = {"$gt": window_start}
+    if range_to:
+        query.setdefault("start", {})["$lt"] = parse_datetime_param(range_to, upper=True)
+    return query
+
+def merge_intervals(intervals) -> list:
+    """Union of (start, end) intervals as a sorted list of disjoint intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+def find_free_slots(window_start: datetime, window_end: datetime, busy, min_minutes: int) -> list:
+    """Gaps of at least min_minutes inside the window that no busy interval covers"""
+    slots = []
+    cursor = window_start
+    for start, end in merge_intervals(busy):
+        if start - cursor >= timedelta(minutes=min_minutes):
+            slots.append((cursor, min(start, window_end)))
+        cursor = max(cursor, end)
+        if cursor >= window_end:
+            break
+    if window_end - cursor >= timedelta(minutes=min_minutes):
+        slots.append((cursor, window_end))
+    return slots
+
+def format_interval(start: datetime, end: datetime) -> dict:
+    return {"start": start.isoformat(), "end": end.isoformat()}
+
+async def ensure_no_conflicts(user_id: str, start: datetime, end: datetime, exclude_id: Optional[ObjectId] = None):
+    conflicts = await find_overlapping_events(
+        [user_id], start, end, exclude_id, {"title": 1, "start": 1}
+    )
+    if conflicts:
+        titles = ", ".join(f"{event['title']} ({event['start'].strftime('%Y-%m-%d %H:%M')})" for event in conflicts[:5])
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Event overlaps with: {titles}"
+        )
+
+# Data migrations
+async def backfill_calendar_event_times() -> int:
+    """Give events created before start/end existed their datetimes, in batches.
+
+    Safe to re-run: it only touches events without a start field, and records
+    completion in the migrations collection so later startups skip the scan.
+    Calendar generations are bumped afterwards so cached event lists refresh.
+    """
+    marker = await migrations_collection.find_one({"_id": "calendar_event_times"})
+    if marker and marker.get("completed_at"):
+        return 0
+    
+    updated = 0
+    while True:
+        events = await calendar_events_collection.find(
+            {"start": {"$exists": False}},
+            {"date": 1, "time": 1, "duration": 1}
+        ).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+        if not events:
+            break
+        
+        operations = []
+        for event in events:
+            try:
+                start, end = event_interval(event["date"], event["time"], event.get("duration") or 60)
+            except (KeyError, TypeError, ValueError):
+                # Unparseable legacy values are stored as null so they are not retried
+                start, end = None, None
+            operations.append(UpdateOne({"_id": event["_id"]}, {"$set": {"start": start, "end": end}}))
+        
+        await calendar_events_collection.bulk_write(operations, ordered=False)
+        updated += len(operations)
+        logger.info("Calendar event backfill progress", extra={"updated": updated})
+    
+    await migrations_collection.update_one(
+        {"_id": "calendar_event_times"},
+        {"$set": {"completed_at": datetime.utcnow(), "updated": updated}},
+        upsert=True
+    )
+    if updated:
+        await bump_generations("calendar_events", await calendar_events_collection.distinct("user_id"))
+    return updated
+
+async def backfill_lead_dedupe_keys() -> int:
+    """Store the duplicate-detection key on leads created before it existed.
+
+    Existing duplicates are keyed like any other lead; only new writes are rejected.
+    """
+    marker = await migrations_collection.find_one({"_id": "lead_dedupe_keys"})
+    if marker and marker.get("completed_at"):
+        return 0
+    
+    updated = 0
+    while True:
+        leads = await leads_collection.find(
+            {"dedupe_key": {"$exists": False}},
+            {"email": 1, "phone": 1, "company_name": 1}
+        ).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+        if not leads:
+            break
+        
+        operations = [
+            UpdateOne({"_id": lead["_id"]}, {"$set": {"dedupe_key": lead_dedupe_key(lead)}})
+            for lead in leads
+        ]
+        await leads_collection.bulk_write(operations, ordered=False)
+        updated += len(operations)
+        logger.info("Lead dedupe key backfill progress", extra={"updated": updated})
+    
+    await migrations_collection.update_one(
+        {"_id": "lead_dedupe_keys"},
+        {"$set": {"completed_at": datetime.utcnow(), "updated": updated}},
+        upsert=True
+    )
+    return updated
+
+LEGACY_LEAD_PROJECTION = {
+    field: 1 for field in (
+        *LEGACY_LEAD_FIELDS,
+        *(legacy for legacy, _ in LEGACY_LEAD_FIELDS.values()),
+        "email", "phone", "update", "created_at", "schema_version"
+    )
+}
+
+def legacy_lead_update(lead: dict) -> dict:
+    """The $set/$unset that moves one lead onto the current schema"""
+    set_fields = {"schema_version": LEAD_SCHEMA_VERSION}
+    unset_fields = {}
+    for field, (legacy, default) in LEGACY_LEAD_FIELDS.items():
+        # Same precedence the formatter used to apply on every read
+        value = lead.get(field) or lead.get(legacy) or default
+        if field not in lead or value != lead[field]:
+            set_fields[field] = value
+        if legacy in lead:
+            unset_fields[legacy] = ""
+    
+    if "update" not in lead:
+        set_fields["update"] = update_label(lead.get("created_at"))
+    
+    set_fields["dedupe_key"] = lead_dedupe_key({**lead, **set_fields})
+    update = {"$set": set_fields}
+    if unset_fields:
+        update["$unset"] = unset_fields
+    return update
+
+async def migrate_legacy_leads() -> int:
+    """Rewrite leads onto LEAD_SCHEMA_VERSION in _id order, batch by batch.
+
+    Progress (last _id, counts) is saved in the migrations collection after
+    every batch, so a restart resumes where the previous run stopped.
+    Reads keep their legacy fallbacks until it completes. At the end, achievements
+    are recomputed and every lead list generation is bumped so cached lists refresh.
+    """
+    marker = await migrations_collection.find_one({"_id": "lead_schema_v2"}) or {}
+    if marker.get("completed_at"):
+        lead_schema_state["migrated"] = True
+        return 0
+    
+    last_id = marker.get("last_id")
+    processed = marker.get("processed", 0)
+    migrated = marker.get("migrated", 0)
+    total = await leads_collection.estimated_document_count()
+    
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id else {}
+        leads = await leads_collection.find(query, LEGACY_LEAD_PROJECTION).sort(
+            "_id", ASCENDING
+        ).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+        if not leads:
+            break
+        
+        operations = [
+            UpdateOne({"_id": lead["_id"]}, legacy_lead_update(lead))
+            for lead in leads
+            if lead.get("schema_version", 0) < LEAD_SCHEMA_VERSION
+        ]
+        if operations:
+            await leads_collection.bulk_write(operations, ordered=False)
+        
+        last_id = leads[-1]["_id"]
+        processed += len(leads)
+        migrated += len(operations)
+        await migrations_collection.update_one(
+            {"_id": "lead_schema_v2"},
+            {"$set": {
+                "last_id": last_id,
+                "processed": processed,
+                "migrated": migrated,
+                "total": total,
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+        logger.info(
+            "Lead schema migration progress",
+            extra={"processed": processed, "total": total, "migrated": migrated}
+        )
+    
+    await migrations_collection.update_one(
+        {"_id": "lead_schema_v2"},
+        {"$set": {"completed_at": datetime.utcnow(), "processed": processed, "migrated": migrated}},
+        upsert=True
+    )
+    lead_schema_state["migrated"] = True
+    
+    if migrated:
+        await reconcile_target_achievements()
+        await bump_generations("leads", await leads_collection.distinct("assigned_to"))
+    return migrated
+
+async def warm_connection_pool():
+    """Open MONGO_MIN_POOL_SIZE connections now instead of on the first requests"""
+    if MONGO_MIN_POOL_SIZE > 0:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(MONGO_MIN_POOL_SIZE)))
+
+async def run_startup_migrations():
+    try:
+        await backfill_calendar_event_times()
+        await migrate_legacy_leads()
+        await backfill_lead_dedupe_keys()
+    except Exception:
+        logger.exception("Startup migration failed")
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    print("Starting up application...")
+    logger.info("Starting up application")
     
     try:
         await client.admin.command('ping')
-        print("MongoDB connection successful!")
-        
-        await users_collection.create_index("email", unique=True)
-        await leads_collection.create_index("email")
-        await leads_collection.create_index("company_name")
-        await leads_collection.create_index("assigned_to")
-        await targets_collection.create_index("user_id", unique=True)
-        await login_attempts_collection.create_index("email", unique=True)
-        await login_attempts_collection.create_index("locked_until", expireAfterSeconds=0)
-        
-        await calendar_events_collection.create_index("user_id")
-        await calendar_events_collection.create_index("date")
-        await calendar_events_collection.create_index("status")
-        await tasks_collection.create_index("user_id")
-        await tasks_collection.create_index("due_date")
-        await tasks_collection.create_index("status")
-        await tasks_collection.create_index("priority")
+        await warm_connection_pool()
+        await ensure_indexes()
+        logger.info("MongoDB connected and indexes ensured")
         
-        print("Database indexes created successfully!")
-        
-        admin_user = await users_collection.find_one({"email": "admin@lead.com"})
+        admin_user = await users_collection.find_one({"email": "admin@lead.com"}, {"_id": 1})
         if not admin_user:
             admin_data = {
                 "name": "Admin User",
                 "email": "admin@lead.com",
-                "password": hash_password("AdminPass123!"),
+                "password": await hash_password_async("AdminPass123!"),
                 "role": "admin",
                 "status": "active",
                 "created_at": datetime.utcnow().isoformat(),
@@ -649,17 +2006,14 @@ async def startup_event():
                 "phone_number": "+1234567890"
             }
             result = await users_collection.insert_one(admin_data)
-            print(f"Default admin user created with ID: {result.inserted_id}")
-            print("Default admin credentials: admin@lead.com / AdminPass123!")
-        else:
-            print("Default admin user already exists")
+            logger.warning("Default admin user admin@lead.com created; change its password", extra={"user_id": str(result.inserted_id)})
 
-        sales_user = await users_collection.find_one({"email": "sales@lead.com"})
+        sales_user = await users_collection.find_one({"email": "sales@lead.com"}, {"_id": 1})
         if not sales_user:
             sales_data = {
                 "name": "Sales User",
                 "email": "sales@lead.com",
-                "password": hash_password("SalesPass123!"),
+                "password": await hash_password_async("SalesPass123!"),
                 "role": "sales",
                 "status": "active",
                 "created_at": datetime.utcnow().isoformat(),
@@ -667,15 +2021,28 @@ async def startup_event():
                 "phone_number": "+1234567891"
             }
             result = await users_collection.insert_one(sales_data)
-            print(f"Default sales user created with ID: {result.inserted_id}")
-            print("Default sales credentials: sales@lead.com / SalesPass123!")
-        else:
-            print("Default sales user already exists")
+            logger.warning("Default sales user sales@lead.com created; change its password", extra={"user_id": str(result.inserted_id)})
+        
+        app.state.reconcile_task = asyncio.create_task(achievement_reconciliation_loop())
+        app.state.migration_task = asyncio.create_task(run_startup_migrations())
+        app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+        if CHANGE_STREAM_EVENTS and await enable_change_stream_events():
+            app.state.change_stream_task = asyncio.create_task(watch_change_stream())
             
-    except Exception as e:
-        print(f"Startup error: {e}")
+    except Exception:
+        logger.exception("Startup failed")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task_name in ("reconcile_task", "change_stream_task", "migration_task", "loop_lag_task"):
+        background_task = getattr(app.state, task_name, None)
+        if background_task:
+            background_task.cancel()
+    password_executor.shutdown(wait=False)
+    client.close()
+    log_listener.stop()
+
 # Health check
 @app.get("/health")
 async def health_check():
@@ -684,7 +2051,8 @@ async def health_check():
         return {
             "status": "healthy", 
             "timestamp": datetime.utcnow().isoformat(),
-            "database": "connected"
+            "database": "connected",
+            "password_hashing": dict(password_work_stats)
         }
     except Exception as e:
         return {
@@ -694,60 +2062,71 @@ async def health_check():
             "error": str(e)
         }
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)):
+    """Prometheus scrape endpoint; set METRICS_TOKEN to require it as a bearer token"""
+    if METRICS_TOKEN and (credentials is None or not secrets.compare_digest(credentials.credentials, METRICS_TOKEN)):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+@app.get("/migrations")
+async def get_migrations(current_user: dict = Depends(get_admin_user)):
+    """Progress of the background data migrations"""
+    migrations = await migrations_collection.find({}).to_list(None)
+    return {
+        "success": True,
+        "data": [serialize_doc(migration) for migration in migrations]
+    }
+
 # Auth endpoints
 @app.post("/auth/login")
-async def login(user_data: UserLogin):
+async def login(user_data: UserLogin, request: Request, background_tasks: BackgroundTasks):
     try:
         email = user_data.email.lower()
+        ip_address = request.client.host if request.client else None
+        
+        logger.debug("Login attempt", extra={"email": email})
         
-        print(f"Login attempt for email: {email}")
+        # Reserving the attempt and reading the user are independent, so run them together
+        attempt, user = await asyncio.gather(
+            reserve_login_attempt(email, ip_address),
+            users_collection.find_one({"email": email})
+        )
         
-        if await is_account_locked(email):
-            print(f"Account locked for email: {email}")
+        if attempt is None:
+            logger.info("Login rejected, account locked", extra={"email": email})
             raise HTTPException(
                 status_code=status.HTTP_423_LOCKED,
                 detail=f"Account locked due to too many failed attempts. Try again in {LOCKOUT_DURATION_MINUTES} minutes."
             )
         
-        user = await users_collection.find_one({"email": email})
-        print(f"User found: {user is not None}")
-        
-        if not user or not verify_password(user_data.password, user["password"]):
-            print("Invalid credentials")
-            await record_login_attempt(email, False)
+        if not user or not await verify_password_async(user_data.password, user["password"]):
+            logger.debug("Login failed, invalid credentials", extra={"email": email})
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
             )
         
-        print(f"User role: {user.get('role')}")
-        
         if user.get("role") not in ["admin", "sales"]:
-            print("User with invalid role attempted login")
-            await record_login_attempt(email, False)
+            logger.warning("Login rejected, invalid role", extra={"email": email, "role": user.get("role")})
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Invalid user role. Please contact your administrator."
             )
         
         if user.get("status") != "active":
-            print("Inactive user attempted login")
-            await record_login_attempt(email, False)
+            logger.info("Login rejected, user inactive", extra={"email": email})
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User account is disabled"
             )
         
-        await record_login_attempt(email, True)
-        
-        await users_collection.update_one(
-            {"_id": user["_id"]},
-            {"$set": {"last_login": datetime.now().strftime("%b %d, %Y")}}
-        )
+        # Resetting the attempt counter and last_login don't affect the response, so run after it is sent
+        background_tasks.add_task(record_successful_login, email, user["_id"], ip_address)
         
         access_token = create_access_token(data={"sub": str(user["_id"])})
         
-        print("Login successful")
+        logger.debug("Login successful", extra={"user_id": str(user["_id"])})
         
         return {
             "success": True,
@@ -760,8 +2139,8 @@ async def login(user_data: UserLogin):
         }
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Login error: {e}")
+    except Exception:
+        logger.exception("Login error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error during login"
@@ -769,12 +2148,17 @@ async def login(user_data: UserLogin):
 
 # User endpoints (Admin only)
 @app.get("/users")
-async def get_users(current_user: dict = Depends(get_admin_user)):
-    users = await users_collection.find({}).to_list(None)
-    return {
+async def get_users(request: Request, fields: Optional[str] = None, current_user: dict = Depends(get_admin_user)):
+    selected, projection = parse_fields(fields, USER_FIELDS)
+    formatter = select_fields(format_user_response, selected)
+    if wants_ndjson(request):
+        return stream_ndjson(users_collection.find({}, projection), formatter)
+    
+    users = await users_collection.find({}, projection).to_list(None)
+    return json_response({
         "success": True,
-        "data": [format_user_response(user) for user in users]
-    }
+        "data": [formatter(user) for user in users]
+    })
 
 @app.post("/users")
 async def create_user(user_data: UserCreate, current_user: dict = Depends(get_admin_user)):
@@ -782,7 +2166,7 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(get_ad
         user_dict = {
             "name": user_data.name,
             "email": user_data.email.lower(),
-            "password": hash_password(user_data.password),
+            "password": await hash_password_async(user_data.password),
             "role": user_data.role,
             "status": "active",
             "phone_number": user_data.phone_number,
@@ -814,7 +2198,7 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_admin_user)
         if str(current_user["_id"]) == user_id:
             raise HTTPException(status_code=400, detail="Cannot delete your own account")
         
-        user_to_delete = await users_collection.find_one({"_id": ObjectId(user_id)})
+        user_to_delete = await users_collection.find_one({"_id": ObjectId(user_id)}, {"role": 1})
 
         if not user_to_delete:
             raise HTTPException(status_code=404, detail="User not found")
@@ -823,6 +2207,7 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_admin_user)
             raise HTTPException(status_code=403, detail="Only sales users can be deleted")
 
         result = await users_collection.delete_one({"_id": ObjectId(user_id)})
+        invalidate_cached_user(user_id)
 
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="User not found during deletion")
@@ -862,8 +2247,13 @@ async def update_user(user_id: str, user_data: UserUpdate, current_user: dict =
         if user_data.role is not None:
             update_data["role"] = user_data.role
 
+        if user_data.status is not None:
+            if user_data.status != "active" and str(current_user["_id"]) == user_id:
+                raise HTTPException(status_code=400, detail="Cannot disable your own account")
+            update_data["status"] = user_data.status
+
         if user_data.password is not None:
-            update_data["password"] = hash_password(user_data.password)
+            update_data["password"] = await hash_password_async(user_data.password)
 
         if not update_data:
             raise HTTPException(status_code=400, detail="No data to update")
@@ -874,13 +2264,13 @@ async def update_user(user_id: str, user_data: UserUpdate, current_user: dict =
             {"_id": ObjectId(user_id)},
             {"$set": update_data}
         )
+        invalidate_cached_user(user_id)
 
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
 
-        updated_user = await users_collection.find_one({"_id": ObjectId(user_id)})
+        updated_user = await users_collection.find_one({"_id": ObjectId(user_id)}, {"password": 0})
         user_response = serialize_doc(updated_user)
-        user_response.pop("password", None)
 
         return {"success": True, "data": user_response}
 
@@ -891,32 +2281,40 @@ async def update_user(user_id: str, user_data: UserUpdate, current_user: dict =
         raise HTTPException(status_code=500, detail="Failed to update user")
 
 @app.get("/salespeople")
-async def get_salespeople(current_user: dict = Depends(get_current_user)):
-    salespeople = await users_collection.find({"role": {"$in": ["sales", "admin"]}}).to_list(None)
-    return {
+async def get_salespeople(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    selected, projection = parse_fields(fields, USER_FIELDS)
+    formatter = select_fields(format_user_response, selected)
+    salespeople = await users_collection.find({"role": {"$in": ["sales", "admin"]}}, projection).to_list(None)
+    return json_response({
         "success": True,
-        "data": [format_user_response(user) for user in salespeople]
-    }
+        "data": [formatter(user) for user in salespeople]
+    })
 
 # NEW - Sales-accessible dropdown endpoints 
 @app.get("/dropdown-options")
-async def get_dropdown_options(current_user: dict = Depends(get_current_user)):
+async def get_dropdown_options(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     """Get dropdown options for leads form - accessible to both admin and sales"""
     try:
-        brands = await brands_collection.find({}).to_list(None)
-        products = await products_collection.find({}).to_list(None)
-        locations = await locations_collection.find({}).to_list(None)
+        brands, products, locations = [
+            await get_reference_snapshot(item_type)
+            for item_type in ("brands", "products", "locations")
+        ]
         
+        etag = compute_etag([brands["etag"], products["etag"], locations["etag"]])
+        if etag_matches(request, etag):
+            return not_modified_response(etag)
+        
+        apply_etag_headers(response, etag)
         return {
             "success": True,
             "data": {
-                "brands": [format_management_response(item) for item in brands],
-                "products": [format_management_response(item) for item in products],
-                "locations": [format_management_response(item) for item in locations]
+                "brands": brands["items"],
+                "products": products["items"],
+                "locations": locations["items"]
             }
         }
     except Exception as e:
-        print(f"Error loading dropdown options: {e}")
+        logger.exception("Error loading dropdown options")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to load dropdown options"
@@ -924,12 +2322,14 @@ async def get_dropdown_options(current_user: dict = Depends(get_current_user)):
 
 # Target endpoints
 @app.get("/targets")
-async def get_all_targets(current_user: dict = Depends(get_admin_user)):
-    targets = await targets_collection.find({}).to_list(None)
-    return {
+async def get_all_targets(fields: Optional[str] = None, current_user: dict = Depends(get_admin_user)):
+    selected, projection = parse_fields(fields, TARGET_FIELDS)
+    formatter = select_fields(format_target_response, selected)
+    targets = await targets_collection.find({}, projection).to_list(None)
+    return json_response({
         "success": True,
-        "data": [format_target_response(target) for target in targets]
-    }
+        "data": [formatter(target) for target in targets]
+    })
 
 @app.get("/targets/{user_id}")
 async def get_user_targets(user_id: str, current_user: dict = Depends(get_current_user)):
@@ -961,7 +2361,7 @@ async def get_user_targets(user_id: str, current_user: dict = Depends(get_curren
 @app.post("/targets")
 async def create_or_update_targets(target_data: TargetCreate, current_user: dict = Depends(get_admin_user)):
     try:
-        user = await users_collection.find_one({"_id": ObjectId(target_data.user_id)})
+        user = await users_collection.find_one({"_id": ObjectId(target_data.user_id)}, {"_id": 1})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1002,7 +2402,7 @@ async def create_or_update_targets(target_data: TargetCreate, current_user: dict
         }
         
     except Exception as e:
-        print(f"Error creating/updating targets: {e}")
+        logger.exception("Error creating/updating targets")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update targets"
@@ -1011,7 +2411,7 @@ async def create_or_update_targets(target_data: TargetCreate, current_user: dict
 @app.put("/targets/{user_id}")
 async def update_targets(user_id: str, target_data: TargetUpdate, current_user: dict = Depends(get_admin_user)):
     try:
-        user = await users_collection.find_one({"_id": ObjectId(user_id)})
+        user = await users_collection.find_one({"_id": ObjectId(user_id)}, {"_id": 1})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1061,12 +2461,20 @@ async def update_targets(user_id: str, target_data: TargetUpdate, current_user:
         }
         
     except Exception as e:
-        print(f"Error updating targets: {e}")
+        logger.exception("Error updating targets")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update targets"
         )
 
+@app.post("/targets/reconcile")
+async def reconcile_targets(current_user: dict = Depends(get_admin_user)):
+    count = await reconcile_target_achievements()
+    return {
+        "success": True,
+        "message": f"Achievements reconciled for {count} users"
+    }
+
 @app.delete("/targets/{user_id}")
 async def delete_targets(user_id: str, current_user: dict = Depends(get_admin_user)):
     result = await targets_collection.delete_one({"user_id": user_id})
@@ -1084,21 +2492,56 @@ async def delete_targets(user_id: str, current_user: dict = Depends(get_admin_us
 
 # Calendar Events endpoints
 @app.get("/calendar/events")
-async def get_calendar_events(current_user: dict = Depends(get_current_user)):
-    events = await calendar_events_collection.find({"user_id": str(current_user["_id"])}).to_list(None)
-    return {
+async def get_calendar_events(
+    request: Request,
+    range_from: Optional[str] = Query(None, alias="from"),
+    range_to: Optional[str] = Query(None, alias="to"),
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """List the user's events, optionally only those overlapping the from/to window"""
+    selected, projection = parse_fields(fields, CALENDAR_EVENT_FIELDS)
+    formatter = select_fields(format_calendar_event_response, selected)
+    query = calendar_events_query(str(current_user["_id"]), range_from, range_to)
+    
+    etag = await get_list_etag(request, "calendar_events", query["user_id"])
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
+    events_cursor = calendar_events_collection.find(query, projection).sort("start", ASCENDING)
+    if wants_ndjson(request):
+        stream = stream_ndjson(events_cursor, formatter)
+        apply_etag_headers(stream, etag)
+        return stream
+    
+    events = await events_cursor.to_list(None)
+    return json_response({
         "success": True,
-        "data": [format_calendar_event_response(event) for event in events]
-    }
+        "data": [formatter(event) for event in events]
+    }, etag)
 
 @app.post("/calendar/events")
-async def create_calendar_event(event_data: CalendarEventCreate, current_user: dict = Depends(get_current_user)):
+async def create_calendar_event(
+    event_data: CalendarEventCreate,
+    check_conflicts: bool = Query(False, alias="checkConflicts"),
+    current_user: dict = Depends(get_current_user)
+):
+    try:
+        start, end = event_interval(event_data.date, event_data.time, event_data.duration)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid event date or time")
+    
+    if check_conflicts and event_data.status != "cancelled":
+        await ensure_no_conflicts(str(current_user["_id"]), start, end)
+    
     event_dict = {
         "title": event_data.title,
         "type": event_data.type,
         "date": event_data.date,
         "time": event_data.time,
         "duration": event_data.duration,
+        "start": start,
+        "end": end,
         "description": event_data.description,
         "contact_name": event_data.contact_name,
         "contact_email": event_data.contact_email,
@@ -1114,6 +2557,8 @@ async def create_calendar_event(event_data: CalendarEventCreate, current_user: d
     
     result = await calendar_events_collection.insert_one(event_dict)
     event_dict["_id"] = result.inserted_id
+    await bump_generations("calendar_events", [event_dict["user_id"]])
+    publish_change("calendar_events", "create", [(event_dict["_id"], {event_dict["user_id"]})])
     
     return {
         "success": True,
@@ -1122,7 +2567,12 @@ async def create_calendar_event(event_data: CalendarEventCreate, current_user: d
     }
 
 @app.put("/calendar/events/{event_id}")
-async def update_calendar_event(event_id: str, event_data: CalendarEventUpdate, current_user: dict = Depends(get_current_user)):
+async def update_calendar_event(
+    event_id: str,
+    event_data: CalendarEventUpdate,
+    check_conflicts: bool = Query(False, alias="checkConflicts"),
+    current_user: dict = Depends(get_current_user)
+):
     try:
         object_id = ObjectId(event_id)
     except:
@@ -1151,6 +2601,20 @@ async def update_calendar_event(event_id: str, event_data: CalendarEventUpdate,
         db_key = field_mapping.get(key, key)
         db_update_data[db_key] = value
     
+    if {"date", "time", "duration"} & db_update_data.keys():
+        merged = {**event, **db_update_data}
+        try:
+            db_update_data["start"], db_update_data["end"] = event_interval(
+                merged["date"], merged["time"], merged["duration"]
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid event date or time")
+    
+    if check_conflicts and db_update_data:
+        merged = {**event, **db_update_data}
+        if merged.get("status") != "cancelled" and merged.get("start"):
+            await ensure_no_conflicts(event["user_id"], merged["start"], merged["end"], exclude_id=object_id)
+    
     if db_update_data:
         db_update_data["updated_at"] = datetime.utcnow().isoformat()
         db_update_data["updated_by"] = str(current_user["_id"])
@@ -1162,6 +2626,8 @@ async def update_calendar_event(event_id: str, event_data: CalendarEventUpdate,
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Event not found")
+        await bump_generations("calendar_events", [event["user_id"]])
+        publish_change("calendar_events", "update", [(object_id, {event["user_id"]})], changed_fields(db_update_data))
     
     updated_event = await calendar_events_collection.find_one({"_id": object_id})
     
@@ -1178,7 +2644,7 @@ async def delete_calendar_event(event_id: str, current_user: dict = Depends(get_
     except:
         raise HTTPException(status_code=400, detail="Invalid event ID")
     
-    event = await calendar_events_collection.find_one({"_id": object_id})
+    event = await calendar_events_collection.find_one({"_id": object_id}, {"user_id": 1})
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     
@@ -1192,21 +2658,118 @@ async def delete_calendar_event(event_id: str, current_user: dict = Depends(get_
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Event not found")
+    await bump_generations("calendar_events", [event["user_id"]])
+    publish_change("calendar_events", "delete", [(object_id, {event["user_id"]})])
     
     return {
         "success": True,
         "message": "Event deleted successfully"
     }
 
-# Tasks endpoints
-@app.get("/tasks")
-async def get_tasks(current_user: dict = Depends(get_current_user)):
-    tasks = await tasks_collection.find({"user_id": str(current_user["_id"])}).to_list(None)
+@app.get("/calendar/free-busy")
+async def get_free_busy(
+    range_from: str = Query(..., alias="from"),
+    range_to: str = Query(..., alias="to"),
+    user_ids: Optional[str] = Query(None, alias="userIds"),
+    duration: int = Query(30, ge=15, le=MAX_EVENT_DURATION_MINUTES),
+    current_user: dict = Depends(get_current_user)
+):
+    """Busy intervals per user and the slots where all of them are free.
+
+    Admins may pass a comma-separated userIds list to schedule a team; everyone
+    else only gets their own calendar.
+    """
+    own_id = str(current_user["_id"])
+    requested = [user_id.strip() for user_id in (user_ids or own_id).split(",") if user_id.strip()]
+    if current_user.get("role") != "admin" and requested != [own_id]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only view your own availability"
+        )
+    
+    window_start = parse_datetime_param(range_from)
+    window_end = parse_datetime_param(range_to, upper=True)
+    if window_end <= window_start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    if window_end - window_start > timedelta(days=MAX_FREE_BUSY_DAYS):
+        raise HTTPException(status_code=400, detail=f"Window cannot exceed {MAX_FREE_BUSY_DAYS} days")
+    
+    events = await find_overlapping_events(
+        requested, window_start, window_end, projection={"user_id": 1, "start": 1, "end": 1}
+    )
+    
+    busy_by_user = {user_id: [] for user_id in requested}
+    for event in events:
+        busy_by_user[event["user_id"]].append((max(event["start"], window_start), min(event["end"], window_end)))
+    
+    all_busy = [interval for intervals in busy_by_user.values() for interval in intervals]
+    
     return {
         "success": True,
-        "data": [format_task_response(task) for task in tasks]
+        "data": {
+            "from": window_start.isoformat(),
+            "to": window_end.isoformat(),
+            "busy": {
+                user_id: [format_interval(start, end) for start, end in merge_intervals(intervals)]
+                for user_id, intervals in busy_by_user.items()
+            },
+            "free": [format_interval(start, end) for start, end in find_free_slots(window_start, window_end, all_busy, duration)]
+        }
     }
 
+# Tasks endpoints
+@app.get("/tasks")
+async def get_tasks(
+    request: Request,
+    filters: tuple = Depends(get_task_filters),
+    sort: str = "dueDate",
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    user_id = str(current_user["_id"])
+    selected, projection = parse_fields(fields, TASK_FIELDS)
+    formatter = select_fields(format_task_response, selected)
+    base_filters, facet_filters = filters
+    base_query = {"user_id": user_id, **base_filters}
+    query = {**base_query, **facet_filters}
+    sort_field, direction = parse_sort(sort, TASK_SORT_FIELDS)
+    
+    etag = await get_list_etag(request, "tasks", user_id)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
+    # Without a page size keep returning the whole (filtered) list for older clients
+    if limit is None and cursor is None:
+        tasks_cursor = tasks_collection.find(query, projection).sort(
+            [(sort_field, direction), ("_id", direction)]
+        )
+        if wants_ndjson(request):
+            stream = stream_ndjson(tasks_cursor, formatter)
+            apply_etag_headers(stream, etag)
+            return stream
+        
+        tasks = await tasks_cursor.to_list(None)
+        return json_response({
+            "success": True,
+            "data": [formatter(task) for task in tasks]
+        }, etag)
+    
+    # The page and the facet counts run concurrently: one round trip of latency,
+    # while the page keeps its index-backed sort outside the $facet
+    (tasks, next_cursor), facet_results = await asyncio.gather(
+        fetch_page(tasks_collection, query, sort_field, direction, limit or 50, cursor, projection),
+        tasks_collection.aggregate(build_task_facets_pipeline(base_query)).to_list(1)
+    )
+    
+    return json_response({
+        "success": True,
+        "data": [formatter(task) for task in tasks],
+        "nextCursor": next_cursor,
+        "facets": format_task_facets(facet_results[0] if facet_results else {})
+    }, etag)
+
 @app.post("/tasks")
 async def create_task(task_data: TaskCreate, current_user: dict = Depends(get_current_user)):
     task_dict = {
@@ -1226,6 +2789,8 @@ async def create_task(task_data: TaskCreate, current_user: dict = Depends(get_cu
     
     result = await tasks_collection.insert_one(task_dict)
     task_dict["_id"] = result.inserted_id
+    await bump_generations("tasks", [task_dict["user_id"]])
+    publish_change("tasks", "create", [(task_dict["_id"], {task_dict["user_id"]})])
     
     return {
         "success": True,
@@ -1274,6 +2839,8 @@ async def update_task(task_id: str, task_data: TaskUpdate, current_user: dict =
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Task not found")
+        await bump_generations("tasks", [task["user_id"]])
+        publish_change("tasks", "update", [(object_id, {task["user_id"]})], changed_fields(db_update_data))
     
     updated_task = await tasks_collection.find_one({"_id": object_id})
     
@@ -1290,7 +2857,7 @@ async def delete_task(task_id: str, current_user: dict = Depends(get_current_use
     except:
         raise HTTPException(status_code=400, detail="Invalid task ID")
     
-    task = await tasks_collection.find_one({"_id": object_id})
+    task = await tasks_collection.find_one({"_id": object_id}, {"user_id": 1})
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -1304,6 +2871,8 @@ async def delete_task(task_id: str, current_user: dict = Depends(get_current_use
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Task not found")
+    await bump_generations("tasks", [task["user_id"]])
+    publish_change("tasks", "delete", [(object_id, {task["user_id"]})])
     
     return {
         "success": True,
@@ -1312,21 +2881,121 @@ async def delete_task(task_id: str, current_user: dict = Depends(get_current_use
 
 # CLEAN LEAD ENDPOINTS
 @app.get("/leads")
-async def get_leads(current_user: dict = Depends(get_current_user)):
-    if current_user.get("role") == "admin":
-        leads = await leads_collection.find({}).to_list(None)
-    else:
-        leads = await leads_collection.find({"assigned_to": str(current_user["_id"])}).to_list(None)
+async def get_leads(
+    request: Request,
+    filters: dict = Depends(get_lead_filters),
+    sort: str = "-createdAt",
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    query = scope_leads_query(filters, current_user)
+    sort_field, direction = parse_sort(sort)
+    selected, projection = parse_fields(fields, LEAD_FIELDS)
+    formatter = select_fields(format_lead_response, selected)
+    
+    owner = None if current_user.get("role") == "admin" else str(current_user["_id"])
+    etag = await get_list_etag(request, "leads", owner)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    
+    # Without a page size keep returning the whole (filtered) list for older clients
+    if limit is None and cursor is None:
+        leads_cursor = leads_collection.find(query, projection).sort(
+            [(sort_field, direction), ("_id", direction)]
+        )
+        if wants_ndjson(request):
+            stream = stream_ndjson(leads_cursor, formatter)
+            apply_etag_headers(stream, etag)
+            return stream
+        
+        leads = await leads_cursor.to_list(None)
+        return json_response({
+            "success": True,
+            "data": [formatter(lead) for lead in leads]
+        }, etag)
     
-    return {
+    leads, next_cursor = await fetch_page(
+        leads_collection, query, sort_field, direction, limit or 50, cursor, projection
+    )
+    
+    return json_response({
         "success": True,
-        "data": [format_lead_response(lead) for lead in leads]
-    }
+        "data": [formatter(lead) for lead in leads],
+        "nextCursor": next_cursor
+    }, etag)
+
+@app.get("/leads/export")
+async def export_leads(
+    filters: dict = Depends(get_lead_filters),
+    sort: str = "-createdAt",
+    file_format: str = Query("csv", alias="format", pattern="^(csv|xlsx)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Export the filtered lead list as CSV (streamed) or XLSX (needs openpyxl)"""
+    query = scope_leads_query(filters, current_user)
+    sort_field, direction = parse_sort(sort)
+    cursor = report_leads_collection.find(query, EXPORT_PROJECTION).sort(
+        [(sort_field, direction), ("_id", direction)]
+    ).batch_size(EXPORT_BATCH_SIZE)
+    
+    filename = f"leads-{datetime.utcnow().strftime('%Y%m%d')}.{file_format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    if file_format == "xlsx":
+        if Workbook is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="XLSX export is not available on this server"
+            )
+        path = await build_leads_xlsx(cursor)
+        return StreamingResponse(
+            stream_file(path),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers=headers
+        )
+    
+    return StreamingResponse(stream_leads_csv(cursor), media_type="text/csv", headers=headers)
+
+@app.get("/leads/search")
+async def search_leads(
+    q: str = Query(..., min_length=1, max_length=200),
+    filters: dict = Depends(get_lead_filters),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Ranked search over company, representative, email, phone and notes"""
+    query = scope_leads_query({**filters, "$text": {"$search": build_search_terms(q)}}, current_user)
+    offset = decode_offset_cursor(cursor)
+    selected, projection = parse_fields(fields, LEAD_FIELDS)
+    formatter = select_fields(format_lead_response, selected)
+    
+    # Relevance order has no stable keyset, so pages are offsets into the
+    # ranked result; MAX_SEARCH_OFFSET keeps the skipped prefix small.
+    leads = await leads_collection.find(
+        query, {**projection, "score": {"$meta": "textScore"}}
+    ).sort(
+        [("score", {"$meta": "textScore"}), ("_id", DESCENDING)]
+    ).skip(offset).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(leads) > limit:
+        leads = leads[:limit]
+        if offset + limit <= MAX_SEARCH_OFFSET:
+            next_cursor = encode_offset_cursor(offset + limit)
+    
+    return json_response({
+        "success": True,
+        "data": [{**formatter(lead), "score": lead["score"]} for lead in leads],
+        "nextCursor": next_cursor
+    })
 
 # CLEAN CREATE LEAD FUNCTION
-@app.post("/leads")
-async def create_lead(lead_data: LeadCreate, current_user: dict = Depends(get_current_user)):
-    lead_dict = {
+def build_lead_document(lead_data: LeadCreate, created_by: str) -> dict:
+    return {
         "company_representative_name": lead_data.company_representative_name,
         "company_name": lead_data.company_name,
         "email": lead_data.email.lower(),
@@ -1342,15 +3011,25 @@ async def create_lead(lead_data: LeadCreate, current_user: dict = Depends(get_cu
         "notes": lead_data.notes,
         "update": datetime.now().strftime("%b %d"),
         "created_at": datetime.utcnow().isoformat(),
-        "created_by": str(current_user["_id"])
+        "created_by": created_by,
+        "dedupe_key": build_dedupe_key(lead_data.email, lead_data.phone, lead_data.company_name),
+        "schema_version": LEAD_SCHEMA_VERSION
     }
+
+@app.post("/leads")
+async def create_lead(lead_data: LeadCreate, current_user: dict = Depends(get_current_user)):
+    lead_dict = build_lead_document(lead_data, str(current_user["_id"]))
+    
+    await validate_lead_references(lead_dict)
+    await ensure_not_duplicate(lead_dict["dedupe_key"])
     
-    print(f"Creating lead with clean data: {lead_dict}")
     result = await leads_collection.insert_one(lead_dict)
     lead_dict["_id"] = result.inserted_id
+    logger.debug("Lead created", extra={"lead_id": str(result.inserted_id)})
     
-    if lead_data.assigned_to:
-        await update_user_targets_achievements(lead_data.assigned_to)
+    await apply_achievement_deltas(None, lead_dict)
+    await bump_generations("leads", [lead_dict["assigned_to"]])
+    publish_change("leads", "create", [(lead_dict["_id"], {lead_dict["assigned_to"]})])
     
     return {
         "success": True,
@@ -1370,8 +3049,6 @@ async def update_lead(lead_id: str, lead_data: LeadUpdate, current_user: dict =
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    old_assigned_to = lead.get("assigned_to")
-    
     if current_user.get("role") == "sales":
         if lead.get("assigned_to") != str(current_user["_id"]):
             raise HTTPException(
@@ -1396,30 +3073,37 @@ async def update_lead(lead_id: str, lead_data: LeadUpdate, current_user: dict =
             value = value.lower()
         db_update_data[db_key] = value
     
+    await validate_lead_references(db_update_data)
+    
+    if {"email", "phone", "company_name"} & db_update_data.keys():
+        db_update_data["dedupe_key"] = lead_dedupe_key({**lead, **db_update_data})
+        await ensure_not_duplicate(db_update_data["dedupe_key"], exclude_id=object_id)
+    
     if db_update_data:
         db_update_data["updated_at"] = datetime.utcnow().isoformat()
         db_update_data["update"] = datetime.now().strftime("%b %d")
         db_update_data["updated_by"] = str(current_user["_id"])
         
-        result = await leads_collection.update_one(
+        # Return the pre-update document so achievement deltas use the exact old values
+        previous_lead = await leads_collection.find_one_and_update(
             {"_id": object_id},
-            {"$set": db_update_data}
+            {"$set": db_update_data},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
+        if previous_lead is None:
             raise HTTPException(status_code=404, detail="Lead not found")
-    
-    updated_lead = await leads_collection.find_one({"_id": object_id})
-    new_assigned_to = updated_lead.get("assigned_to")
-    
-    users_to_update = set()
-    if old_assigned_to:
-        users_to_update.add(old_assigned_to)
-    if new_assigned_to:
-        users_to_update.add(new_assigned_to)
-    
-    for user_id in users_to_update:
-        await update_user_targets_achievements(user_id)
+        
+        updated_lead = {**previous_lead, **db_update_data}
+        await apply_achievement_deltas(previous_lead, updated_lead)
+        await bump_generations("leads", [previous_lead.get("assigned_to"), updated_lead.get("assigned_to")])
+        publish_change(
+            "leads", "update",
+            [(object_id, {previous_lead.get("assigned_to"), updated_lead.get("assigned_to")})],
+            changed_fields(db_update_data)
+        )
+    else:
+        updated_lead = lead
     
     return {
         "success": True,
@@ -1434,12 +3118,10 @@ async def delete_lead(lead_id: str, current_user: dict = Depends(get_current_use
     except:
         raise HTTPException(status_code=400, detail="Invalid lead ID")
     
-    lead = await leads_collection.find_one({"_id": object_id})
+    lead = await leads_collection.find_one({"_id": object_id}, {"assigned_to": 1})
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    assigned_to = lead.get("assigned_to")
-    
     if current_user.get("role") == "sales":
         if lead.get("assigned_to") != str(current_user["_id"]):
             raise HTTPException(
@@ -1447,13 +3129,14 @@ async def delete_lead(lead_id: str, current_user: dict = Depends(get_current_use
                 detail="You can only delete leads assigned to you"
             )
     
-    result = await leads_collection.delete_one({"_id": object_id})
+    deleted_lead = await leads_collection.find_one_and_delete({"_id": object_id})
     
-    if result.deleted_count == 0:
+    if deleted_lead is None:
         raise HTTPException(status_code=404, detail="Lead not found")
     
-    if assigned_to:
-        await update_user_targets_achievements(assigned_to)
+    await apply_achievement_deltas(deleted_lead, None)
+    await bump_generations("leads", [deleted_lead.get("assigned_to")])
+    publish_change("leads", "delete", [(object_id, {deleted_lead.get("assigned_to")})])
     
     return {
         "success": True,
@@ -1467,7 +3150,7 @@ async def bulk_delete_leads(request: BulkDeleteRequest, current_user: dict = Dep
     except:
         raise HTTPException(status_code=400, detail="Invalid lead IDs")
     
-    leads = await leads_collection.find({"_id": {"$in": object_ids}}).to_list(None)
+    leads = await leads_collection.find({"_id": {"$in": object_ids}}, {"assigned_to": 1}).to_list(None)
     assigned_users = set()
     
     if current_user.get("role") == "sales":
@@ -1486,8 +3169,9 @@ async def bulk_delete_leads(request: BulkDeleteRequest, current_user: dict = Dep
     
     result = await leads_collection.delete_many({"_id": {"$in": object_ids}})
     
-    for user_id in assigned_users:
-        await update_user_targets_achievements(user_id)
+    await recompute_users_achievements(assigned_users)
+    await bump_generations("leads", assigned_users)
+    publish_change("leads", "delete", [(lead["_id"], {lead.get("assigned_to")}) for lead in leads])
     
     return {
         "success": True,
@@ -1501,7 +3185,7 @@ async def bulk_assign_leads(request: BulkAssignRequest, current_user: dict = Dep
     except:
         raise HTTPException(status_code=400, detail="Invalid lead IDs")
     
-    leads = await leads_collection.find({"_id": {"$in": object_ids}}).to_list(None)
+    leads = await leads_collection.find({"_id": {"$in": object_ids}}, {"assigned_to": 1}).to_list(None)
     old_assigned_users = set()
     for lead in leads:
         if lead.get("assigned_to"):
@@ -1521,52 +3205,262 @@ async def bulk_assign_leads(request: BulkAssignRequest, current_user: dict = Dep
     affected_users = old_assigned_users.copy()
     affected_users.add(request.sales_person_id)
     
-    for user_id in affected_users:
-        await update_user_targets_achievements(user_id)
+    await recompute_users_achievements(affected_users)
+    await bump_generations("leads", affected_users)
+    publish_change(
+        "leads", "update",
+        [(lead["_id"], {lead.get("assigned_to"), request.sales_person_id}) for lead in leads],
+        ["assignedTo"]
+    )
     
     return {
         "success": True,
         "message": f"{result.modified_count} leads assigned successfully"
     }
 
-# Management endpoints (Admin only)
-@app.get("/management/{item_type}")
-async def get_management_items(item_type: str, current_user: dict = Depends(get_admin_user)):
-    collection_map = {
-        "brands": brands_collection,
-        "products": products_collection,
-        "locations": locations_collection,
-        "statuses": statuses_collection,
-        "sources": sources_collection,
-        "ownership": ownership_collection
+@app.post("/leads/import")
+async def import_leads(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson)$"),
+    current_user: dict = Depends(get_admin_user)
+):
+    """Import leads from CSV or NDJSON, validating and inserting in batches"""
+    if file_format is None:
+        filename = (file.filename or "").lower()
+        file_format = "ndjson" if filename.endswith((".ndjson", ".jsonl")) or "ndjson" in (file.content_type or "") else "csv"
+    
+    created_by = str(current_user["_id"])
+    inserted = 0
+    failed = 0
+    duplicates = 0
+    errors = []
+    affected_users = set()
+    seen_keys = set()
+    
+    def add_error(row_number: int, messages: List[str]):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "errors": messages})
+    
+    def add_duplicate(row_number: int):
+        nonlocal duplicates
+        duplicates += 1
+        add_error(row_number, ["Duplicate of an existing lead (same email, phone and company)"])
+    
+    async def flush(batch: list):
+        nonlocal inserted
+        if not batch:
+            return
+        # One indexed lookup per batch for leads that already exist
+        existing_keys = {
+            doc["dedupe_key"] async for doc in leads_collection.find(
+                {"dedupe_key": {"$in": [document["dedupe_key"] for _, document in batch]}},
+                {"dedupe_key": 1}
+            )
+        }
+        for row_number, document in batch:
+            if document["dedupe_key"] in existing_keys:
+                add_duplicate(row_number)
+        batch = [(row_number, document) for row_number, document in batch if document["dedupe_key"] not in existing_keys]
+        if not batch:
+            return
+        documents = [document for _, document in batch]
+        try:
+            result = await leads_collection.insert_many(documents, ordered=False)
+            inserted_ids = result.inserted_ids
+        except BulkWriteError as e:
+            failed_indexes = {error["index"] for error in e.details.get("writeErrors", [])}
+            for error in e.details.get("writeErrors", []):
+                add_error(batch[error["index"]][0], [error.get("errmsg", "Insert failed")])
+            inserted_ids = [document["_id"] for index, document in enumerate(documents) if index not in failed_indexes]
+            documents = [document for index, document in enumerate(documents) if index not in failed_indexes]
+        
+        inserted += len(inserted_ids)
+        owners = {document["assigned_to"] for document in documents if document.get("assigned_to")}
+        affected_users.update(owners)
+        await bump_generations("leads", owners)
+        publish_change("leads", "create", [(document["_id"], {document.get("assigned_to")}) for document in documents])
+    
+    # Decoding and model validation run off the event loop, one chunk at a time
+    rows = iter_import_rows(file, file_format)
+    next_row = 1
+    file_error = None
+    try:
+        while True:
+            parsed, file_error, exhausted = await run_in_threadpool(read_import_chunk, rows, next_row, created_by)
+            next_row += len(parsed)
+            batch = []
+            for row_number, document in parsed:
+                if isinstance(document, list):
+                    add_error(row_number, document)
+                    continue
+                try:
+                    await validate_lead_references(document)
+                except HTTPException as e:
+                    add_error(row_number, [e.detail])
+                    continue
+                
+                if document["dedupe_key"] in seen_keys:
+                    add_duplicate(row_number)
+                    continue
+                seen_keys.add(document["dedupe_key"])
+                batch.append((row_number, document))
+            await flush(batch)
+            if exhausted:
+                break
+    finally:
+        rows.close()
+    
+    # Achievements are recomputed once per affected user rather than per row
+    await recompute_users_achievements(affected_users)
+    
+    message = f"{inserted} leads imported, {failed} rows failed"
+    if file_error:
+        # Rows before the bad one are already inserted, so report them rather than failing the request
+        message = f"Import stopped early. {file_error}. {message}"
+    return {
+        "success": file_error is None,
+        "data": {
+            "inserted": inserted,
+            "failed": failed,
+            "duplicates": duplicates,
+            "errors": errors,
+            "errorsTruncated": failed > len(errors),
+            "fileError": file_error
+        },
+        "message": message
+    }
+
+# Change notification stream
+@app.post("/events/stream-token")
+async def create_stream_token(current_user: dict = Depends(get_current_user)):
+    """Short-lived token that only opens /events/stream, so the access token never goes in a URL"""
+    token = create_access_token(
+        data={"sub": str(current_user["_id"])},
+        expires_delta=timedelta(minutes=STREAM_TOKEN_EXPIRE_MINUTES),
+        token_type="stream"
+    )
+    return {
+        "success": True,
+        "data": {"token": token, "expiresIn": STREAM_TOKEN_EXPIRE_MINUTES * 60}
+    }
+
+@app.get("/events/stream")
+async def stream_changes(
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+):
+    """Server-Sent Events feed of lead, task and calendar changes visible to the caller.
+
+    EventSource cannot set headers, so ?token= takes a stream token from
+    POST /events/stream-token; an Authorization header takes the access token.
+    The token is re-checked every keepalive interval and the stream ends with an
+    "expired" event once it fails, so the client reconnects with a new one.
+    """
+    token_type = "stream"
+    if credentials:
+        token, token_type = credentials.credentials, "access"
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user = await authenticate_token(token, token_type)
+    
+    subscriber = {
+        "user_id": str(user["_id"]),
+        "role": user.get("role"),
+        "queue": asyncio.Queue(maxsize=EVENT_STREAM_QUEUE_SIZE),
+        "overflowed": False
     }
     
-    if item_type not in collection_map:
+    async def still_authenticated() -> bool:
+        try:
+            await authenticate_token(token, token_type)
+        except HTTPException:
+            return False
+        return True
+    
+    async def generate():
+        loop = asyncio.get_running_loop()
+        next_check = loop.time() + EVENT_STREAM_KEEPALIVE_SECONDS
+        change_subscribers.add(subscriber)
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                if loop.time() >= next_check:
+                    if not await still_authenticated():
+                        yield "event: expired\ndata: {}\n\n"
+                        return
+                    next_check = loop.time() + EVENT_STREAM_KEEPALIVE_SECONDS
+                if subscriber["overflowed"]:
+                    subscriber["overflowed"] = False
+                    subscriber["queue"] = asyncio.Queue(maxsize=EVENT_STREAM_QUEUE_SIZE)
+                    yield "event: resync\ndata: {}\n\n"
+                    continue
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber["queue"].get(), timeout=EVENT_STREAM_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: change\ndata: {json.dumps(event)}\n\n"
+        finally:
+            change_subscribers.discard(subscriber)
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Report endpoints
+@app.get("/reports/summary")
+async def get_report_summary(
+    created_from: Optional[str] = Query(None, alias="createdFrom"),
+    created_to: Optional[str] = Query(None, alias="createdTo"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Dashboard and report numbers computed in one aggregation; sales users only see their own leads"""
+    query = scope_leads_query(build_created_range(created_from, created_to), current_user)
+    
+    results = await report_leads_collection.aggregate(build_report_summary_pipeline(query)).to_list(1)
+    
+    return {
+        "success": True,
+        "data": format_report_summary(results[0])
+    }
+
+# Management endpoints (Admin only)
+@app.get("/management/{item_type}")
+async def get_management_items(item_type: str, request: Request, response: Response, current_user: dict = Depends(get_admin_user)):
+    if item_type not in MANAGEMENT_COLLECTIONS:
         raise HTTPException(status_code=400, detail="Invalid item type")
     
-    collection = collection_map[item_type]
-    items = await collection.find({}).to_list(None)
+    collection = MANAGEMENT_COLLECTIONS[item_type]
+    if wants_ndjson(request):
+        return stream_ndjson(collection.find({}), format_management_response)
+    
+    snapshot = await get_reference_snapshot(item_type)
+    if etag_matches(request, snapshot["etag"]):
+        return not_modified_response(snapshot["etag"])
     
+    apply_etag_headers(response, snapshot["etag"])
     return {
         "success": True,
-        "data": [format_management_response(item) for item in items]
+        "data": snapshot["items"]
     }
 
 @app.post("/management/{item_type}")
 async def create_management_item(item_type: str, item_data: dict, current_user: dict = Depends(get_admin_user)):
-    collection_map = {
-        "brands": brands_collection,
-        "products": products_collection,
-        "locations": locations_collection,
-        "statuses": statuses_collection,
-        "sources": sources_collection,
-        "ownership": ownership_collection
-    }
-    
-    if item_type not in collection_map:
+    if item_type not in MANAGEMENT_COLLECTIONS:
         raise HTTPException(status_code=400, detail="Invalid item type")
     
-    collection = collection_map[item_type]
+    collection = MANAGEMENT_COLLECTIONS[item_type]
     
     item_data["created_at"] = datetime.utcnow().isoformat()
     item_data["created_by"] = str(current_user["_id"])
@@ -1575,6 +3469,7 @@ async def create_management_item(item_type: str, item_data: dict, current_user:
     try:
         result = await collection.insert_one(item_data)
         item_data["_id"] = result.inserted_id
+        await bump_reference_version(item_type)
         
         return {
             "success": True,
@@ -1589,16 +3484,7 @@ async def create_management_item(item_type: str, item_data: dict, current_user:
 
 @app.put("/management/{item_type}/{item_id}")
 async def update_management_item(item_type: str, item_id: str, item_data: dict, current_user: dict = Depends(get_admin_user)):
-    collection_map = {
-        "brands": brands_collection,
-        "products": products_collection,
-        "locations": locations_collection,
-        "statuses": statuses_collection,
-        "sources": sources_collection,
-        "ownership": ownership_collection
-    }
-    
-    if item_type not in collection_map:
+    if item_type not in MANAGEMENT_COLLECTIONS:
         raise HTTPException(status_code=400, detail="Invalid item type")
     
     try:
@@ -1606,7 +3492,7 @@ async def update_management_item(item_type: str, item_id: str, item_data: dict,
     except:
         raise HTTPException(status_code=400, detail="Invalid item ID")
     
-    collection = collection_map[item_type]
+    collection = MANAGEMENT_COLLECTIONS[item_type]
     
     item_data["updated_at"] = datetime.utcnow().isoformat()
     item_data["updated_by"] = str(current_user["_id"])
@@ -1622,6 +3508,7 @@ async def update_management_item(item_type: str, item_id: str, item_data: dict,
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail=f"{item_type.capitalize()[:-1]} not found")
+        await bump_reference_version(item_type)
         
         updated_item = await collection.find_one({"_id": object_id})
         
@@ -1638,16 +3525,7 @@ async def update_management_item(item_type: str, item_id: str, item_data: dict,
 
 @app.delete("/management/{item_type}/{item_id}")
 async def delete_management_item(item_type: str, item_id: str, current_user: dict = Depends(get_admin_user)):
-    collection_map = {
-        "brands": brands_collection,
-        "products": products_collection,
-        "locations": locations_collection,
-        "statuses": statuses_collection,
-        "sources": sources_collection,
-        "ownership": ownership_collection
-    }
-    
-    if item_type not in collection_map:
+    if item_type not in MANAGEMENT_COLLECTIONS:
         raise HTTPException(status_code=400, detail="Invalid item type")
     
     try:
@@ -1655,13 +3533,14 @@ async def delete_management_item(item_type: str, item_id: str, current_user: dic
     except:
         raise HTTPException(status_code=400, detail="Invalid item ID")
     
-    collection = collection_map[item_type]
+    collection = MANAGEMENT_COLLECTIONS[item_type]
     
     try:
         result = await collection.delete_one({"_id": object_id})
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail=f"{item_type.capitalize()[:-1]} not found")
+        await bump_reference_version(item_type)
         
         return {
             "success": True,
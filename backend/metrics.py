@@ -0,0 +1,199 @@
+"""Prometheus metrics for the CRM API.
+
+Exposes request latency and status counts per route template, MongoDB command
+latency and errors per collection/command, connection pool checkout wait,
+event-loop lag and the password hashing queue. ``main`` serves them at /metrics.
+
+Metrics are kept per process; with several uvicorn workers scrape each one or
+aggregate in Prometheus.
+"""
+import asyncio
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from pymongo import monitoring
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route"]
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP responses by route template and status code",
+    ["method", "route", "status"]
+)
+
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency as reported by the driver",
+    ["command", "collection"],
+    buckets=MONGO_BUCKETS
+)
+MONGO_COMMAND_ERRORS = Counter(
+    "mongodb_command_errors_total",
+    "MongoDB commands that failed",
+    ["command", "collection"]
+)
+MONGO_POOL_CHECKOUT = Histogram(
+    "mongodb_pool_checkout_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=MONGO_BUCKETS
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total",
+    "Connection checkouts that failed",
+    ["reason"]
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between when the lag probe should have woken up and when it did",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+EVENT_LOOP_LAG_LAST = Gauge("event_loop_lag_last_seconds", "Most recent event-loop lag sample")
+
+# Commands whose first field is not a collection name
+NON_COLLECTION_COMMANDS = {"ping", "hello", "isMaster", "ismaster", "endSessions", "buildInfo", "serverStatus"}
+
+
+def command_collection(command_name: str, command) -> str:
+    if command_name == "getMore":
+        return str(command.get("collection", ""))
+    if command_name in NON_COLLECTION_COMMANDS:
+        return ""
+    target = command.get(command_name)
+    return target if isinstance(target, str) else ""
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every command; the collection is taken from the started event"""
+
+    def __init__(self):
+        self.collections = {}
+
+    def started(self, event):
+        self.collections[(event.connection_id, event.request_id)] = command_collection(
+            event.command_name, event.command
+        )
+
+    def succeeded(self, event):
+        collection = self.collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self.collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_ERRORS.labels(event.command_name, collection).inc()
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Checkout wait: started and checked-out events arrive on the same driver thread"""
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self.local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self.local, "started", None)
+        if started is not None:
+            MONGO_POOL_CHECKOUT.observe(time.perf_counter() - started)
+            self.local.started = None
+
+    def connection_check_out_failed(self, event):
+        self.local.started = None
+        MONGO_POOL_CHECKOUT_FAILURES.labels(str(event.reason)).inc()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+
+class PasswordWorkCollector:
+    """Reads the bcrypt executor counters from the stats dict at scrape time"""
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    def collect(self):
+        queued = GaugeMetricFamily("password_hash_queue_depth", "Password hash jobs waiting for a worker")
+        queued.add_metric([], self.stats["queued"])
+        yield queued
+        in_flight = GaugeMetricFamily("password_hash_in_flight", "Password hash jobs running")
+        in_flight.add_metric([], self.stats["in_flight"])
+        yield in_flight
+        completed = CounterMetricFamily("password_hash_completed", "Password hash jobs finished")
+        completed.add_metric([], self.stats["completed"])
+        yield completed
+        rejected = CounterMetricFamily("password_hash_rejected", "Password hash jobs rejected because the queue was full")
+        rejected.add_metric([], self.stats["rejected"])
+        yield rejected
+
+
+def register_password_work(stats: dict):
+    REGISTRY.register(PasswordWorkCollector(stats))
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
+
+
+class MetricsMiddleware:
+    """Records latency and status per route template (not raw path, to bound label values)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route_path).observe(time.perf_counter() - started)
+            REQUESTS.labels(method, route_path, str(status_code)).inc()
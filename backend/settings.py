@@ -0,0 +1,69 @@
+"""MongoDB client settings, read from the environment.
+
+    MONGODB_CONNECTION_STRING          connection URI (defaults to a local server)
+    MONGO_MAX_POOL_SIZE=100            connections per server
+    MONGO_MIN_POOL_SIZE=10             connections kept open and warmed at startup
+    MONGO_MAX_IDLE_TIME_MS=300000      close pooled connections idle this long
+    MONGO_SERVER_SELECTION_TIMEOUT_MS=5000
+    MONGO_CONNECT_TIMEOUT_MS=10000
+    MONGO_COMPRESSORS=zstd,zlib        wire compression, first one the server supports wins
+    MONGO_READ_PREFERENCE=primary      default for every query
+    MONGO_REPORT_READ_PREFERENCE=secondaryPreferred
+                                       used by report and export reads
+
+These keyword options override the same options in the connection string.
+zstd needs the zstandard package (in requirements.txt); snappy needs
+python-snappy. zlib is built in and works with every server.
+"""
+import os
+
+from dotenv import load_dotenv
+from pymongo import ReadPreference
+
+load_dotenv()
+
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST
+}
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def read_preference(name: str):
+    if name not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference {name!r}, expected one of {', '.join(READ_PREFERENCES)}")
+    return READ_PREFERENCES[name]
+
+
+DEFAULT_MONGODB_CONNECTION_STRING = "mongodb://localhost:27017/zownlead_crm"
+MONGODB_CONNECTION_STRING = os.getenv("MONGODB_CONNECTION_STRING")
+
+MONGO_MAX_POOL_SIZE = env_int("MONGO_MAX_POOL_SIZE", 100)
+MONGO_MIN_POOL_SIZE = env_int("MONGO_MIN_POOL_SIZE", 10)
+MONGO_MAX_IDLE_TIME_MS = env_int("MONGO_MAX_IDLE_TIME_MS", 300000)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)
+MONGO_CONNECT_TIMEOUT_MS = env_int("MONGO_CONNECT_TIMEOUT_MS", 10000)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,zlib")
+MONGO_READ_PREFERENCE = read_preference(os.getenv("MONGO_READ_PREFERENCE", "primary"))
+MONGO_REPORT_READ_PREFERENCE = read_preference(os.getenv("MONGO_REPORT_READ_PREFERENCE", "secondaryPreferred"))
+MONGO_APP_NAME = os.getenv("MONGO_APP_NAME", "zownlead-crm-api")
+
+
+def mongo_client_options() -> dict:
+    """Keyword arguments for AsyncIOMotorClient"""
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "compressors": MONGO_COMPRESSORS,
+        "read_preference": MONGO_READ_PREFERENCE,
+        "appname": MONGO_APP_NAME
+    }
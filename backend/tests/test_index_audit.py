@@ -0,0 +1,25 @@
+"""Fails when an endpoint query needs a collection scan or an in-memory sort.
+
+Needs a MongoDB server (MONGODB_CONNECTION_STRING, or a local one); the test
+is skipped when none is reachable.
+"""
+import asyncio
+
+import pytest
+
+import audit_indexes
+import main
+
+
+async def audit_endpoint_queries() -> list:
+    try:
+        await main.client.admin.command("ping")
+    except Exception as exc:
+        pytest.skip(f"MongoDB is not reachable: {exc}")
+    await main.ensure_indexes()
+    return await audit_indexes.audit(main.db, audit_indexes.representative_commands())
+
+
+def test_endpoint_queries_use_indexes():
+    problems = asyncio.run(audit_endpoint_queries())
+    assert not problems, "\n".join(f"{', '.join(found)}: {command}" for command, found in problems)
@@ -14,7 +14,10 @@ const apiConfig = {
       update: (id: string) => `/leads/${id}`,
       delete: (id: string) => `/leads/${id}`,
       bulkDelete: '/leads/bulk-delete',
-      bulkAssign: '/leads/bulk-assign'
+      bulkAssign: '/leads/bulk-assign',
+      import: '/leads/import',
+      export: '/leads/export',
+      search: '/leads/search'
     },
     users: {
       list: '/users',
@@ -44,6 +47,13 @@ const apiConfig = {
       update: (id: string) => `/tasks/${id}`,
       delete: (id: string) => `/tasks/${id}`
     },
+    events: {
+      streamToken: '/events/stream-token',
+      stream: '/events/stream'
+    },
+    reports: {
+      summary: '/reports/summary'
+    },
     management: {
       get: (type: string) => `/management/${type}`,
       create: (type: string) => `/management/${type}`,
@@ -4,6 +4,8 @@ interface ApiResponse<T> {
   data: T;
   message?: string;
   success: boolean;
+  nextCursor?: string | null;
+  facets?: Record<string, Record<string, number>>;
 }
 
 class ApiService {
@@ -134,6 +136,46 @@ class ApiService {
     return this.request(endpoint);
   }
 
+  // Keyset-paginated lead list; pass the previous response's nextCursor to continue
+  async getLeadsPage(params: Record<string, any> = {}, cursor?: string | null, limit: number = 50) {
+    const query: Record<string, string> = { limit: String(limit) };
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null && value !== '') {
+        query[key] = String(value);
+      }
+    });
+    if (cursor) {
+      query.cursor = cursor;
+    }
+    return this.request(`/leads?${new URLSearchParams(query).toString()}`);
+  }
+
+  // Ranked server-side lead search; pass nextCursor back to load more results
+  async searchLeads(q: string, params: Record<string, any> = {}, cursor?: string | null, limit: number = 20) {
+    const query: Record<string, string> = { q, limit: String(limit) };
+    Object.entries(params).forEach(([key, value]) => {
+      if (value !== undefined && value !== null && value !== '') {
+        query[key] = String(value);
+      }
+    });
+    if (cursor) {
+      query.cursor = cursor;
+    }
+    return this.request(`/leads/search?${new URLSearchParams(query).toString()}`);
+  }
+
+  // Download the filtered lead list as a CSV or XLSX file
+  async exportLeads(params: Record<string, any> = {}, format: 'csv' | 'xlsx' = 'csv'): Promise<Blob> {
+    const query = new URLSearchParams({ ...params, format }).toString();
+    const response = await fetch(`${this.baseURL}/leads/export?${query}`, {
+      headers: this.token ? { Authorization: `Bearer ${this.token}` } : {},
+    });
+    if (!response.ok) {
+      throw new Error(`Export failed with status ${response.status}`);
+    }
+    return response.blob();
+  }
+
   async createLead(leadData: any) {
     // Ensure we're sending clean data structure
     const cleanLeadData = {
@@ -265,9 +307,81 @@ class ApiService {
     });
   }
 
+  // Live change notifications (Server-Sent Events); the caller closes the returned subscription.
+  // EventSource can't send headers, so each connection uses a short-lived stream token in the URL
+  // and a new one is fetched whenever the server ends the stream or the connection drops.
+  subscribeToChanges(onChange: (change: any) => void, onResync?: () => void): { close: () => void } | null {
+    if (!this.token) {
+      return null;
+    }
+    let source: EventSource | null = null;
+    let closed = false;
+
+    const connect = async () => {
+      let streamToken: string;
+      try {
+        const response = await this.request<{ token: string; expiresIn: number }>('/events/stream-token', {
+          method: 'POST',
+        });
+        streamToken = response.data.token;
+      } catch (error) {
+        console.error('Could not open change stream:', error);
+        return;
+      }
+      if (closed) {
+        return;
+      }
+      source = new EventSource(`${this.baseURL}/events/stream?token=${encodeURIComponent(streamToken)}`);
+      source.addEventListener('change', (event) => onChange(JSON.parse((event as MessageEvent).data)));
+      if (onResync) {
+        source.addEventListener('resync', () => onResync());
+      }
+      let ended = false;
+      const reconnect = () => {
+        // 'expired' is followed by an error when the server closes the stream; reconnect once
+        if (ended) {
+          return;
+        }
+        ended = true;
+        source?.close();
+        if (!closed) {
+          setTimeout(connect, 5000);
+        }
+      };
+      source.addEventListener('expired', reconnect);
+      source.onerror = reconnect;
+    };
+
+    connect();
+    return {
+      close: () => {
+        closed = true;
+        source?.close();
+      },
+    };
+  }
+
+  // Report methods
+  async getReportSummary(params?: { createdFrom?: string; createdTo?: string }) {
+    const queryString = params ? new URLSearchParams(params as Record<string, string>).toString() : '';
+    return this.request(queryString ? `/reports/summary?${queryString}` : '/reports/summary');
+  }
+
   // Calendar Events methods
-  async getCalendarEvents() {
-    return this.request('/calendar/events');
+  async getCalendarEvents(range?: { from?: string; to?: string }) {
+    const queryString = range ? new URLSearchParams(range as Record<string, string>).toString() : '';
+    return this.request(queryString ? `/calendar/events?${queryString}` : '/calendar/events');
+  }
+
+  async getFreeBusy(params: { from: string; to: string; userIds?: string[]; duration?: number }) {
+    const query: Record<string, string> = { from: params.from, to: params.to };
+    if (params.userIds?.length) {
+      query.userIds = params.userIds.join(',');
+    }
+    if (params.duration) {
+      query.duration = String(params.duration);
+    }
+    return this.request(`/calendar/free-busy?${new URLSearchParams(query).toString()}`);
   }
 
   async createCalendarEvent(eventData: any) {
@@ -291,8 +405,9 @@ class ApiService {
   }
 
   // Tasks methods
-  async getTasks() {
-    return this.request('/tasks');
+  async getTasks(params?: Record<string, any>) {
+    const queryString = params ? new URLSearchParams(params).toString() : '';
+    return this.request(queryString ? `/tasks?${queryString}` : '/tasks');
   }
 
   async createTask(taskData: any) {